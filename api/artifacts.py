@@ -0,0 +1,174 @@
+"""
+Local store of the source files of the importer
+
+Files are stored by the SHA-256 of their contents, and the URL (or archive
+member) they came from points to that hash, so each file is downloaded once
+and checked when it is stored. Downloads are written to a `.part` file and
+resumed with HTTP range requests when interrupted. When a mirror directory
+is given the store works offline, taking files from the mirror instead.
+"""
+import os
+import tempfile
+import zlib
+from hashlib import sha256
+from typing import IO, Optional
+from urllib.parse import urlsplit
+from zipfile import BadZipFile, ZipFile
+
+import requests
+
+from .settings import ARTIFACT_DIR, ARTIFACT_MIRROR
+
+CHUNK_SIZE = 1 << 20
+
+
+class ArtifactError(Exception):
+    """A file could not be obtained, was not a valid archive, or did not match its checksum"""
+
+
+class ArtifactStore:
+    """
+    Files in `root/objects/<digest>`, with `root/refs/<hash of key>` holding
+    the digest of the file of each URL. `offline` stores never use the
+    network, which is implied by `mirror`.
+    """
+
+    def __init__(self, root: str = ARTIFACT_DIR, mirror: Optional[str] = ARTIFACT_MIRROR, offline: bool = False):
+        self.root = root
+        self.mirror = mirror
+        self.offline = offline or mirror is not None
+        for directory in ("objects", "refs", "partial"):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    @staticmethod
+    def _key_name(key: str) -> str:
+        return sha256(key.encode()).hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Returns the stored file of `key`, if any"""
+        try:
+            with open(self._path("refs", self._key_name(key))) as fh:
+                digest = fh.read().strip()
+        except FileNotFoundError:
+            return None
+        path = self._path("objects", digest)
+        return path if os.path.isfile(path) else None
+
+    def _store(self, key: str, source: str, digest: str, expected: Optional[str]) -> str:
+        """Moves a complete file into the store, recording it under `key`"""
+        if expected is not None and digest != expected.lower():
+            os.remove(source)
+            raise ArtifactError(f"{key}: expected SHA-256 {expected}, got {digest}")
+        path = self._path("objects", digest)
+        os.replace(source, path)
+        (fd, ref) = tempfile.mkstemp(dir=self._path("refs"))
+        with os.fdopen(fd, "w") as fh:
+            fh.write(digest)
+        os.replace(ref, self._path("refs", self._key_name(key)))
+        return path
+
+    def _forget(self, key: str):
+        """Drops the record of `key`, so that its file is obtained again"""
+        try:
+            os.remove(self._path("refs", self._key_name(key)))
+        except FileNotFoundError:
+            pass
+
+    def _ingest(self, key: str, stream: IO[bytes], expected: Optional[str]) -> str:
+        """Stores the contents of a stream, hashing it while it is copied"""
+        digest = sha256()
+        (fd, temp) = tempfile.mkstemp(dir=self._path("partial"))
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    fh.write(chunk)
+        except BaseException:
+            os.remove(temp)
+            raise
+        return self._store(key, temp, digest.hexdigest(), expected)
+
+    def _mirrored(self, path: str) -> Optional[str]:
+        """Finds a URL path in the mirror, either as is or by its file name anywhere inside it"""
+        path = path.lstrip("/")
+        if os.path.isfile(os.path.join(self.mirror, path)):
+            return os.path.join(self.mirror, path)
+        name = os.path.basename(path)
+        for (root, _dirs, files) in os.walk(self.mirror):
+            if name in files:
+                return os.path.join(root, name)
+        return None
+
+    def _download(self, url: str, expected: Optional[str]) -> str:
+        """Downloads a URL, resuming a previous partial download if there is one"""
+        partial = self._path("partial", self._key_name(url) + ".part")
+        offset = os.path.getsize(partial) if os.path.isfile(partial) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with requests.get(url, stream=True, headers=headers, timeout=60) as response:
+                if response.status_code == 416 and offset:
+                    # The partial file is either complete or longer than the file, then it starts over
+                    if response.headers.get("Content-Range") != f"bytes */{offset}":
+                        os.remove(partial)
+                        raise ArtifactError(f"{url}: HTTP 416 resuming at byte {offset}")
+                elif response.status_code in (200, 206):
+                    mode = "ab" if response.status_code == 206 else "wb"
+                    with open(partial, mode) as fh:
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            fh.write(chunk)
+                else:
+                    raise ArtifactError(f"{url}: HTTP {response.status_code}")
+        except requests.RequestException as e:
+            raise ArtifactError(f"{url}: {e}") from e
+        digest = sha256()
+        with open(partial, "rb") as fh:
+            for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return self._store(url, partial, digest.hexdigest(), expected)
+
+    def fetch(self, url: str, expected: Optional[str] = None) -> str:
+        """
+        Returns the path of the stored file of `url`, obtaining it from the
+        mirror or the network first if needed. `expected` is its SHA-256.
+        """
+        path = self.lookup(url)
+        if path is not None:
+            return path
+        if self.mirror is not None:
+            mirrored = self._mirrored(urlsplit(url).path)
+            if mirrored is None:
+                raise ArtifactError(f"{url} is not available in the mirror {self.mirror}")
+            with open(mirrored, "rb") as fh:
+                return self._ingest(url, fh, expected)
+        if self.offline:
+            raise ArtifactError(f"{url} was never downloaded and the store is offline")
+        return self._download(url, expected)
+
+    def extract(self, url: str, member: str, expected: Optional[str] = None) -> str:
+        """
+        Returns the path of the stored file of a member of the zip archive at
+        `url`. The member is streamed out of the stored archive, or taken
+        from the mirror as is when the mirror has it but not the archive.
+        """
+        key = f"{url}#{member}"
+        path = self.lookup(key)
+        if path is not None:
+            return path
+        if self.mirror is not None and self.lookup(url) is None and self._mirrored(urlsplit(url).path) is None:
+            mirrored = self._mirrored(member)
+            if mirrored is not None:
+                with open(mirrored, "rb") as fh:
+                    return self._ingest(key, fh, expected)
+        try:
+            with ZipFile(self.fetch(url)) as archive, archive.open(member) as fh:
+                return self._ingest(key, fh, expected)
+        except KeyError as e:
+            raise ArtifactError(f"{member} not found in {url}") from e
+        except (BadZipFile, EOFError, zlib.error) as e:
+            # The stored archive is corrupt, it is obtained again next time
+            self._forget(url)
+            raise ArtifactError(f"{url} is not a valid zip archive: {e}") from e
+
@@ -0,0 +1,52 @@
+"""
+Process-wide cache of the users behind tokens
+
+Resolving a user's id, admin flag and roles takes several queries that every
+authenticated request would otherwise repeat. They are cached per username
+for AUTH_CACHE_TTL seconds. Routes changing a user's roles must call
+`invalidate`, routes creating or deleting roles `clear`; changes made by
+other processes are seen once the entries expire.
+"""
+from threading import Lock
+from typing import FrozenSet, NamedTuple, Optional
+
+from cachetools import TTLCache
+
+from .settings import AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+
+# Key of the principal of requests without a token
+ANONYMOUS = ''
+
+
+class Principal(NamedTuple):
+    """User of a request, `id` is None for anonymous requests. `role_ids` includes the guest role"""
+
+    id: Optional[int]
+    admin: bool
+    role_ids: FrozenSet[int]
+
+
+_principals: TTLCache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+_principals_lock = Lock()
+
+
+def get(username: str) -> Optional[Principal]:
+    with _principals_lock:
+        return _principals.get(username)
+
+
+def put(username: str, principal: Principal):
+    with _principals_lock:
+        _principals[username] = principal
+
+
+def invalidate(username: str):
+    """Drops the cached principal of a user"""
+    with _principals_lock:
+        _principals.pop(username, None)
+
+
+def clear():
+    """Drops every cached principal"""
+    with _principals_lock:
+        _principals.clear()
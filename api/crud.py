@@ -5,12 +5,13 @@ CRUD
 # pylint: disable=C0321
 # pylint: disable=no-name-in-module
 
-from typing import List, Optional, Union
+from typing import Iterable, List, Optional, Union
 
-from sqlalchemy import literal
-from sqlalchemy.orm import Session, Query
+from sqlalchemy import literal, select
+from sqlalchemy.orm import Session, Query, undefer_group
 
-from . import models, schemas
+from . import auth_cache, models, schemas, sweeper
+from .auth_cache import Principal
 
 
 def query_guest_role(db: Session) -> Query:
@@ -26,37 +27,69 @@ def query_user_role_list(db: Session, user_id: int) -> Query:
 
 
 def is_user_admin(db: Session, db_user: models.User) -> bool:
-    return db.query(literal(True)).filter(db_user.roles.filter(models.Role.name == 'admin').exists()).scalar() or False
+    admin = db.query(models.User).filter(models.User.id == db_user.id, models.User.roles.any(name='admin'))
+    return db.query(literal(True)).filter(admin.exists()).scalar() or False
+
+
+def visible_to(role_ids: Iterable[int]):
+    """
+    Filters models visible to any of the roles, as a semi-join on the
+    model_roles index, so a model with several of the roles is returned once
+    """
+    return models.Model.id.in_(select([models.model_roles.c.model_id])
+                               .where(models.model_roles.c.role_id.in_(list(role_ids))))
 
 
 # Model
-def get_model(db: Session, model_id: int, roles: Optional[Query], admin: bool = False) -> Optional[models.Model]:
-    """Retrieve an model by id"""
+def get_model(db: Session, model_id: int, role_ids: Optional[Iterable[int]], admin: bool = False,
+              with_matrices: bool = False) -> Optional[models.Model]:
+    """Retrieve an model by id, matrices are loaded on access unless `with_matrices` is set"""
 
-    query: Query = db.query(models.Model).filter_by(id=model_id).outerjoin(models.Model.roles)
+    query: Query = db.query(models.Model).filter_by(id=model_id)
     if not admin:
-        query = query.filter(models.Role.id.in_(roles.subquery()))
+        query = query.filter(visible_to(role_ids))
+    if with_matrices:
+        query = query.options(undefer_group('matrices'))
     return query.scalar()
 
 
 # Model
-def get_temporary_model(db: Session, model_id: int, user: models.User, admin: bool = False) -> Optional[
-    models.TempModel]:
-    """Retrieve an model by id"""
+def get_temporary_model(db: Session, model_id: int, user_id: Optional[int], admin: bool = False,
+                        with_matrices: bool = False) -> Optional[models.TempModel]:
+    """Retrieve an model by id, matrices are loaded on access unless `with_matrices` is set"""
 
+    if user_id is None and not admin:
+        return None
     query: Query = db.query(models.TempModel).filter_by(id=model_id)
     if not admin:
-        query = query.filter_by(user_id=user.id)
-    return query.scalar()
+        query = query.filter_by(user_id=user_id)
+    if with_matrices:
+        query = query.options(undefer_group('matrices'))
+    model = query.scalar()
+    if model is not None:
+        sweeper.record_access(db, model)
+    return model
 
 
-def get_models_filtered_role(db: Session, roles: Optional[Query], admin: bool = False) -> List[models.Model]:
-    """Retrieve models filtered by roles"""
+def touch_model(model: Union[models.Model, models.TempModel]):
+    """Bumps the version of a model, to be committed together with its changes"""
+    model.version = type(model).version + 1
+
 
-    query: Query = db.query(models.Model).outerjoin(models.Model.roles)
+def query_models_filtered_role(db: Session, role_ids: Optional[Iterable[int]], admin: bool = False) -> Query:
+    """Query of the models visible to the roles, all of them for admins"""
+
+    query: Query = db.query(models.Model)
     if not admin:
-        query = query.filter(models.Role.id.in_(roles.subquery()))
-    return query.all()
+        query = query.filter(visible_to(role_ids))
+    return query
+
+
+def get_models_filtered_role(db: Session, role_ids: Optional[Iterable[int]], admin: bool = False) -> \
+        List[models.Model]:
+    """Retrieve models filtered by roles"""
+
+    return query_models_filtered_role(db, role_ids, admin).order_by(models.Model.id).all()
 
 
 # Sector
@@ -79,6 +112,8 @@ def create_role(db: Session, role: schemas.RoleCreate):
     db_role = models.Role(**role.dict())
     db.add(db_role)
     db.commit()
+    # A new guest role changes the roles of every user
+    auth_cache.clear()
     return db_role
 
 
@@ -91,19 +126,13 @@ def try_delete_role(db: Session, role_id: int, force: bool = False) -> bool:
     db_role = db.query(models.Role).filter_by(id=role_id).scalar()
     db.delete(db_role)
     db.commit()
+    auth_cache.clear()
     return True
 
 
-def fetch_model(db: Session, model_id: int, user: Optional[models.User]) -> \
+def fetch_model(db: Session, model_id: int, principal: Principal, with_matrices: bool = False) -> \
         Optional[Union[models.Model, models.TempModel]]:
+    """Retrieve a model or temporary model (negative id) by id, if `principal` can access it"""
     if model_id >= 0:
-        if user is None:
-            model = get_model(db, model_id, query_guest_role(db))
-        elif is_user_admin(db, user):
-            model = get_model(db, model_id, None, True)
-        else:
-            # noinspection PyUnresolvedReferences
-            model = get_model(db, model_id, db.query(models.Role.id).select_entity_from(user.roles.subquery()))
-    else:
-        model = get_temporary_model(db, -model_id, user, False if user is None else is_user_admin(db, user))
-    return model
+        return get_model(db, model_id, principal.role_ids, principal.admin, with_matrices=with_matrices)
+    return get_temporary_model(db, -model_id, principal.id, principal.admin, with_matrices=with_matrices)
@@ -1,21 +1,39 @@
 """
 Utilitary methods to setup an SQLAlchemy session
 """
-import pickle
+import struct
+from typing import Any
+
 import numpy
 
 from sqlalchemy.engine import Engine
 from sqlalchemy.engine.interfaces import Dialect
 from sqlalchemy import create_engine, types, event
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlite3 import Cursor, Connection
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
+from .settings import DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_POOL_TIMEOUT, SQLITE_BUSY_TIMEOUT, \
+    SQLITE_CACHE_SIZE, SQLITE_JOURNAL_MODE, SQLITE_MMAP_SIZE, SQLITE_SYNCHRONOUS
+
+
+def create_db_engine(url: str) -> Engine:
+    """Creates the engine for a database URL, with a sized connection pool"""
+    database_url = make_url(url)
+    if database_url.get_backend_name() != 'sqlite':
+        return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                             pool_timeout=DB_POOL_TIMEOUT, pool_pre_ping=True)
+    if database_url.database in (None, '', ':memory:'):
+        # Each connection to an in-memory database is a different database
+        return create_engine(url, connect_args={"check_same_thread": False})
+    # File databases otherwise get no pool, each session would reopen the file and lose its page cache
+    return create_engine(url, connect_args={"check_same_thread": False}, poolclass=QueuePool,
+                         pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+engine = create_db_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -23,23 +41,77 @@ Base = declarative_base()
 
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(conn: Connection, _connection_record):
+    if not isinstance(conn, Connection):
+        return
     cursor: Cursor = conn.cursor()
     cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT:d}")
+    # WAL lets readers go on while a request writes, NORMAL is durable enough with it
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE:d}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE:d}")
     cursor.close()
 
 
+MATRIX_MAGIC = b"\x93HMX"
+MATRIX_FORMAT_VERSION = 1
+
+# magic, format version, memory order, length of the dtype descriptor, number of dimensions
+_MATRIX_HEADER = struct.Struct("<4sBcBB")
+
+
+def encode_matrix(value: numpy.ndarray) -> bytes:
+    """
+    Serializes an array as a versioned header (dtype, shape and memory order)
+    followed by its raw contiguous bytes
+    """
+    if value.dtype.hasobject:
+        raise TypeError("Object arrays can not be stored as matrices")
+    order = b"F" if value.flags.f_contiguous and not value.flags.c_contiguous else b"C"
+    dtype = value.dtype.str.encode("ascii")
+    header = _MATRIX_HEADER.pack(MATRIX_MAGIC, MATRIX_FORMAT_VERSION, order, len(dtype), value.ndim)
+    shape = struct.pack(f"<{value.ndim}Q", *value.shape)
+    return b"".join((header, dtype, shape, value.tobytes(order=order.decode())))
+
+
+def decode_matrix(data: bytes) -> numpy.ndarray:
+    """
+    Loads an array written by `encode_matrix` without copying its contents,
+    the result is a read-only view over `data`
+    """
+    magic, version, order, dtype_len, ndim = _MATRIX_HEADER.unpack_from(data)
+    if magic != MATRIX_MAGIC:
+        raise ValueError("Unknown matrix format, legacy pickled matrices must be migrated first")
+    if version != MATRIX_FORMAT_VERSION:
+        raise ValueError(f"Unsupported matrix format version {version}")
+    offset = _MATRIX_HEADER.size
+    dtype = numpy.dtype(bytes(data[offset:offset + dtype_len]).decode("ascii"))
+    offset += dtype_len
+    shape = struct.unpack_from(f"<{ndim}Q", data, offset)
+    offset += 8 * ndim
+    count = int(numpy.prod(shape))
+    return numpy.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape, order=order.decode())
+
+
 class NumpyColumnType(types.TypeDecorator):
     impl = types.LargeBinary
+    cache_ok = True
 
     def process_bind_param(self, value: numpy.ndarray, dialect: Dialect) -> bytes:
-        return pickle.dumps(value)
+        return None if value is None else encode_matrix(value)
 
     def process_result_value(self, value: bytes, dialect: Dialect) -> numpy.ndarray:
-        return pickle.loads(value)
+        return None if value is None else decode_matrix(value)
 
     def process_literal_param(self, value, dialect):
         raise NotImplementedError()
 
+    def compare_values(self, x: Any, y: Any) -> bool:
+        if isinstance(x, numpy.ndarray) and isinstance(y, numpy.ndarray):
+            return x.dtype == y.dtype and numpy.array_equal(x, y)
+        return x is y
+
     @property
     def python_type(self):
         return numpy.ndarray
@@ -1,16 +1,281 @@
 """
 Adquire dados do IBGE
 """
+import json
+import os
+import re
+import shutil
+import tempfile
 from functools import lru_cache
+from hashlib import sha256
+from typing import Dict, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+from zipfile import ZipFile
 
 import numpy as np
 import pandas as pd
 import pyexcel as p
 from requests import get
 
+from .indicators import compute_indicators
+from .settings import IBGE_CACHE_DIR
+
+
+class CachedBook:
+    """
+    A workbook whose sheets were converted to arrays, so it can be stored on
+    disk and memory-mapped instead of parsing the spreadsheet again.
+
+    Each sheet is kept as two arrays of the same shape: `values`, with the
+    numeric value of cells (NaN elsewhere), and `labels`, with the text cells
+    ('' elsewhere).
+    """
+
+    def __init__(self, sheets: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        self.sheets = sheets
+
+    @classmethod
+    def from_book(cls, book) -> "CachedBook":
+        """Converts a loaded pyexcel book, or a dict of sheets as rows"""
+        if not isinstance(book, dict):
+            book = book.to_dict()
+        return cls({name: cls._convert_sheet(rows) for (name, rows) in book.items()})
+
+    @staticmethod
+    def _convert_sheet(rows: List[list]) -> Tuple[np.ndarray, np.ndarray]:
+        width = max((len(row) for row in rows), default=0)
+        values = np.full((len(rows), width), np.nan)
+        labels = np.full((len(rows), width), "", dtype=object)
+        for (i, row) in enumerate(rows):
+            for (j, cell) in enumerate(row):
+                if isinstance(cell, (int, float)) and not isinstance(cell, bool):
+                    values[i, j] = cell
+                    continue
+                labels[i, j] = str(cell)
+                try:
+                    # Numeric text (e.g. product codes) keeps both representations
+                    values[i, j] = float(cell)
+                except (TypeError, ValueError):
+                    pass
+        return values, labels.astype(str)
+
+    def save(self, path: str):
+        """Stores the book as a directory of `.npy` files, replacing it atomically"""
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=parent)
+        for (idx, (values, labels)) in enumerate(self.sheets.values()):
+            np.save(os.path.join(staging, f"{idx}_values.npy"), values)
+            np.save(os.path.join(staging, f"{idx}_labels.npy"), labels)
+        with open(os.path.join(staging, "sheets.json"), "w") as fh:
+            json.dump(list(self.sheets), fh)
+        try:
+            os.rename(staging, path)
+        except OSError:
+            # Another process stored the same book first
+            shutil.rmtree(staging)
+
+    @classmethod
+    def load(cls, path: str) -> "CachedBook":
+        """Loads a book stored by `save`, memory-mapping its arrays"""
+        with open(os.path.join(path, "sheets.json")) as fh:
+            names = json.load(fh)
+        return cls({name: (np.load(os.path.join(path, f"{idx}_values.npy"), mmap_mode="r"),
+                           np.load(os.path.join(path, f"{idx}_labels.npy"), mmap_mode="r"))
+                    for (idx, name) in enumerate(names)})
+
+    def _sheet(self, sheet_name: str) -> Tuple[np.ndarray, np.ndarray]:
+        try:
+            return self.sheets[sheet_name]
+        except KeyError as e:
+            raise Exception(
+                f"Planilha {sheet_name} não encontrada! Planilhas: {list(self.sheets)}"
+            ) from e
+
+    @staticmethod
+    def _cell(value: float, label: str):
+        if label:
+            return label
+        if np.isnan(value):
+            return ""
+        return int(value) if value.is_integer() else value
+
+    def rows(self, sheet_name: str) -> List[list]:
+        """Returns a sheet as rows of cells, like a pyexcel book"""
+        values, labels = self._sheet(sheet_name)
+        return [[self._cell(value, label) for (value, label) in zip(value_row.tolist(), label_row.tolist())]
+                for (value_row, label_row) in zip(values, labels)]
+
+    def slice(self, sheet_name: str, slice_, target_type=float) -> np.ndarray:
+        """Returns the data inside a numpy slice of a sheet, see `load_sheet_slice`"""
+        values, labels = self._sheet(sheet_name)
+        if target_type is float:
+            return np.array(values[slice_], dtype=float)
+        cells = np.vectorize(self._cell, otypes=[object])(values[slice_], labels[slice_])
+        data = np.array(cells.tolist())
+        return data.astype(target_type) if target_type else data
+
+
+_TABLE_NS = "urn:oasis:names:tc:opendocument:xmlns:table:1.0"
+_OFFICE_NS = "urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+_TABLE = f"{{{_TABLE_NS}}}table"
+_TABLE_NAME = f"{{{_TABLE_NS}}}name"
+_TABLE_ROW = f"{{{_TABLE_NS}}}table-row"
+_TABLE_CELL = f"{{{_TABLE_NS}}}table-cell"
+_COLUMNS_REPEATED = f"{{{_TABLE_NS}}}number-columns-repeated"
+_VALUE_TYPE = f"{{{_OFFICE_NS}}}value-type"
+_NUMERIC_TYPES = ("float", "percentage", "currency")
+_VALUE_ATTRIBUTES = {
+    "date": f"{{{_OFFICE_NS}}}date-value",
+    "time": f"{{{_OFFICE_NS}}}time-value",
+    "boolean": f"{{{_OFFICE_NS}}}boolean-value",
+}
+
+# Sheets read by the importer. Rows are limited where only a fixed row is used;
+# the limits stay below the last row, so column slices keep the full width.
+MIP_SHEETS = {"03": None, "04": 134, "05": 134, "06": 134, "13": None}
+VA_SHEETS = {"VA": None}
+
+_WORKBOOK_NAME = re.compile(r"Matriz_de_Insumo_Produto_(?P<mip>\d{4})_Nivel_67\.ods|68_tab2_(?P<va>\d{4})\.ods")
+
+
+class _SheetBuffer:
+    """Preallocated `values` and `labels` arrays of a sheet, grown geometrically"""
+
+    def __init__(self):
+        self.values = np.full((256, 128), np.nan)
+        self.labels = np.full((256, 128), "", dtype=object)
+        self.height = 0
+        self.width = 0
+
+    def _reserve(self, rows: int, columns: int):
+        (capacity_rows, capacity_columns) = self.values.shape
+        if rows <= capacity_rows and columns <= capacity_columns:
+            return
+        shape = (capacity_rows if rows <= capacity_rows else max(rows, 2 * capacity_rows),
+                 capacity_columns if columns <= capacity_columns else max(columns, 2 * capacity_columns))
+        values = np.full(shape, np.nan)
+        labels = np.full(shape, "", dtype=object)
+        values[:capacity_rows, :capacity_columns] = self.values
+        labels[:capacity_rows, :capacity_columns] = self.labels
+        (self.values, self.labels) = (values, labels)
+
+    def add_row(self, cells: List[Tuple[int, Optional[float], str]]):
+        """Stores a row, given as its non-empty `(column, value, label)` cells"""
+        row = self.height
+        self.height += 1
+        if not cells:
+            return
+        self._reserve(self.height, cells[-1][0] + 1)
+        for (column, value, label) in cells:
+            if value is not None:
+                self.values[row, column] = value
+            if label:
+                self.labels[row, column] = label
+        self.width = max(self.width, cells[-1][0] + 1)
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        return (self.values[:self.height, :self.width].copy(),
+                self.labels[:self.height, :self.width].astype(str))
+
+
+def _read_cell(element) -> Tuple[Optional[float], str]:
+    """Returns the value and label of a cell, the way pyexcel-odsr reads it"""
+    value_type = element.get(_VALUE_TYPE)
+    if value_type in _NUMERIC_TYPES:
+        return float(element.get(f"{{{_OFFICE_NS}}}value")), ""
+    if value_type == "string":
+        label = "\n".join("".join(child.itertext()) for child in element)
+        try:
+            return float(label), label
+        except ValueError:
+            return None, label
+    if value_type in _VALUE_ATTRIBUTES:
+        return None, element.get(_VALUE_ATTRIBUTES[value_type]) or ""
+    return None, ""
+
+
+def stream_book(file_name: str, sheets: Optional[Dict[str, Optional[int]]] = None) -> CachedBook:
+    """
+    Reads a workbook by streaming its `content.xml`, without building the
+    sheets as Python lists first. Only the sheets named in `sheets` are kept,
+    each up to the given number of rows (None for all of them), and parsing
+    stops as soon as they have been read.
+
+    Rows and cells are counted as pyexcel-odsr does (repeated rows once,
+    covered cells skipped, trailing empty cells dropped), since the slices
+    used in this module were written against its output.
+    """
+    pending = dict(sheets) if sheets is not None else None
+    buffers: Dict[str, _SheetBuffer] = {}
+    with ZipFile(file_name) as archive, archive.open("content.xml") as content:
+        (buffer, limit) = (None, None)
+        for (event, element) in iterparse(content, events=("start", "end")):
+            if element.tag == _TABLE:
+                if event == "start":
+                    name = element.get(_TABLE_NAME)
+                    if pending is None or name in pending:
+                        limit = pending.pop(name) if pending is not None else None
+                        buffer = buffers[name] = _SheetBuffer()
+                    continue
+                element.clear()
+                buffer = None
+                if pending is not None and not pending:
+                    break
+            elif event == "end" and element.tag == _TABLE_ROW:
+                if buffer is not None and (limit is None or buffer.height < limit):
+                    cells = []
+                    column = 0
+                    for cell in element.iterfind(_TABLE_CELL):
+                        repeat = int(cell.get(_COLUMNS_REPEATED, 1))
+                        (value, label) = _read_cell(cell)
+                        if value is not None or label:
+                            cells.extend((column + k, value, label) for k in range(repeat))
+                        column += repeat
+                    buffer.add_row(cells)
+                element.clear()
+
+    return CachedBook({name: buffer.arrays() for (name, buffer) in buffers.items()})
+
+
+def file_digest(file_name: str) -> str:
+    """Returns the SHA-256 of a file's contents"""
+    digest = sha256()
+    with open(file_name, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def open_book(file_name: str, cache_dir: Optional[str] = IBGE_CACHE_DIR,
+              sheets: Optional[Dict[str, Optional[int]]] = None) -> CachedBook:
+    """
+    Loads a workbook, converting it with pyexcel only the first time it is
+    seen. Converted books are stored in `cache_dir`, keyed by the hash of
+    the file, and memory-mapped afterwards.
+
+    When `sheets` is given, only those sheets are read, with `stream_book`.
+    """
+    def convert():
+        if sheets is not None:
+            return stream_book(file_name, sheets)
+        return CachedBook.from_book(p.get_book(file_name=file_name))
+
+    if cache_dir is None:
+        return convert()
+    key = file_digest(file_name)
+    if sheets is not None:
+        key += "-" + sha256(json.dumps(sheets, sort_keys=True).encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, key)
+    if not os.path.isdir(path):
+        convert().save(path)
+    return CachedBook.load(path)
+
 
 @lru_cache(maxsize=10)
 def load_sheet(book, sheet_name):
+    if isinstance(book, CachedBook):
+        return book.rows(sheet_name)
     if not isinstance(book, dict):
         book = book.to_dict()
 
@@ -37,6 +302,9 @@ def load_sheet_slice(book, sheet_name, slice_, target_type=float) -> np.ndarray:
         slice_ (`tuple`): A valid numpy slice, as returned by `numpy.s_`
         target_type (`type`):
     """
+    if isinstance(book, CachedBook):
+        return book.slice(sheet_name, slice_, target_type)
+
     data = load_sheet(book, sheet_name)
     data = np.array(data)
 
@@ -105,20 +373,21 @@ def get_taxes(book):
     return internal_taxes + import_taxes
 
 
-def get_added_value(va_book):
-    def sum_and_replace(values, column_a, column_b):
-        values = values.T.copy()
-        values[column_a] = values[column_a] + values[column_b]
-        values = np.delete(values, column_b, axis=0)
-        return values.T
-
-    operations_titles = load_sheet_slice(va_book, "VA", np.s_[5:-6, 0], target_type=str)
+def added_value_arrays(va_book) -> Tuple[List[str], np.ndarray]:
+    """
+    Returns the operation titles of the VA sheet and their values per sector,
+    as in `get_added_value`
+    """
+    titles = load_sheet_slice(va_book, "VA", np.s_[5:-6, 0], target_type=str).tolist()
     values = load_sheet_slice(va_book, "VA", np.s_[5:-6, 1:-1])
-    values = sum_and_replace(values, 40, 41)
-    added_value = zip(operations_titles, values)
-    added_value = [[a, *b] for a, b in added_value]
+    # Columns 40 and 41 of the table are a single sector of the MIP
+    values[:, 40] += values[:, 41]
+    return titles, np.delete(values, 41, axis=1)
+
 
-    return added_value
+def get_added_value(va_book):
+    titles, values = added_value_arrays(va_book)
+    return [[title, *row] for (title, row) in zip(titles, values)]
 
 
 def build_z_matrix(book, va_book):
@@ -161,6 +430,75 @@ def build_a_matrix(book, va_book):
     return df_a
 
 
+def z_matrix_arrays(book, va_book) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    Builds the Z Matrix for a given year as an array, returning the names of
+    its rows and columns separately
+    """
+    sectors = load_sectors(book)
+    titles, added_value = added_value_arrays(va_book)
+    z_matrix = np.vstack([
+        get_marketshare(book) @ get_national_supply_demand(book),
+        get_imports(book),
+        get_taxes(book),
+        added_value,
+    ])
+    rows = [*sectors, "Importação", "Impostos indiretos líquidos de Subsídios", *titles]
+    return rows, sectors, z_matrix
+
+
+def a_matrix_arrays(book, va_book) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    Builds the A Matrix for a given year as an array, returning the names of
+    its rows and columns separately
+    """
+    rows, columns, z_matrix = z_matrix_arrays(book, va_book)
+    # The second to last row is the total production of each sector
+    return rows, columns, z_matrix / z_matrix[-2]
+
+
+def build_model_data(book, va_book) -> dict:
+    """
+    Computes everything stored in a `Model` from the MIP and the value added
+    (tab2) workbooks: its matrices and indicators, the `(name, value_added)`
+    of its sectors and the names of its categories
+    """
+    z_rows, sectors, z_matrix = z_matrix_arrays(book, va_book)
+    production = z_matrix[-2]
+    size = len(sectors)
+    a_matrix = z_matrix[:size] / production
+    catimpct = z_matrix[size:] / production
+    l_matrix = np.linalg.inv(np.eye(size) - a_matrix)
+    linkage, catmult = compute_indicators(l_matrix, catimpct)
+
+    return {
+        "economic_matrix": a_matrix,
+        "leontief_matrix": l_matrix,
+        "catimpct_matrix": catimpct,
+        "linkage_matrix": linkage,
+        "catmult_matrix": catmult,
+        "sectors": list(zip(sectors, production.tolist())),
+        "categories": [name.strip() for name in z_rows[size:]],
+    }
+
+
+def find_workbooks(directories: List[str]) -> Dict[int, Tuple[str, str]]:
+    """
+    Searches directories for the MIP and tab2 workbooks of every year,
+    returning the `(book, va_book)` paths of years that have both
+    """
+    found: Dict[str, Dict[int, str]] = {"mip": {}, "va": {}}
+    for directory in directories:
+        for (root, _dirs, files) in os.walk(directory):
+            for file in files:
+                match = _WORKBOOK_NAME.fullmatch(file)
+                if match:
+                    kind = "mip" if match["mip"] else "va"
+                    found[kind].setdefault(int(match["mip"] or match["va"]), os.path.join(root, file))
+    return {year: (found["mip"][year], found["va"][year])
+            for year in sorted(found["mip"].keys() & found["va"].keys())}
+
+
 def main():
     book = p.get_book(file_name="tests/Matriz_de_Insumo_Produto_2015_Nivel_67.ods")
     va_book = p.get_book(file_name="tests/68_tab2_2015.ods")
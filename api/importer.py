@@ -0,0 +1,131 @@
+"""
+Imports IBGE input-output tables as models
+
+Workbooks are parsed and the matrices computed in a pool of processes, while
+the main process is the only one writing to the database. Every year is
+committed in its own transaction, and years whose model already exists are
+skipped, so an interrupted import can simply be run again.
+"""
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import ibge, migrations, models
+from .artifacts import ArtifactError, ArtifactStore
+from .database import Base, SessionLocal, engine
+from .settings import ARTIFACT_DIR, ARTIFACT_MIRROR, IBGE_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def model_name(year: int) -> str:
+    return f"IBGE {year}"
+
+
+# pylint: disable=line-too-long
+MIP_URL = "https://ftp.ibge.gov.br/Contas_Nacionais/Matriz_de_Insumo_Produto/{year}/Matriz_de_Insumo_Produto_{year}_Nivel_67.ods"
+VA_ARCHIVE_URL = "https://ftp.ibge.gov.br/Contas_Nacionais/Sistema_de_Contas_Nacionais/{year}/tabelas_ods/tabelas_de_recursos_e_usos/nivel_68_2010_{year}_ods.zip"
+VA_MEMBER = "nivel68_2010_{year}_ods/68_tab2_{year}.ods"
+# pylint: enable=line-too-long
+
+
+def fetch_year(store: ArtifactStore, year: int) -> Tuple[str, str]:
+    """Returns the stored `(book, va_book)` workbooks of a year, downloading them if needed"""
+    return (store.fetch(MIP_URL.format(year=year)),
+            store.extract(VA_ARCHIVE_URL.format(year=year), VA_MEMBER.format(year=year)))
+
+
+def build_year(year: int, book_file: str, va_file: str, cache_dir: Optional[str]) -> Tuple[int, dict]:
+    """Parses the workbooks of a year and computes its model, runs in the worker processes"""
+    book = ibge.open_book(book_file, cache_dir, sheets=ibge.MIP_SHEETS)
+    va_book = ibge.open_book(va_file, cache_dir, sheets=ibge.VA_SHEETS)
+    return year, ibge.build_model_data(book, va_book)
+
+
+def existing_years(db: Session, years: List[int]) -> List[int]:
+    names = {name for (name,) in db.query(models.Model.name).filter(models.Model.name.in_(map(model_name, years)))}
+    return [year for year in years if model_name(year) in names]
+
+
+def store_model(db: Session, year: int, data: dict) -> models.Model:
+    """Inserts the model of a year, with its sectors and categories, in a single transaction"""
+    model = models.Model(name=model_name(year), **{key: value for (key, value) in data.items()
+                                                   if key not in ('sectors', 'categories')})
+    db.add(model)
+    db.flush()
+    db.bulk_insert_mappings(models.Sector, [
+        dict(name=name, model_id=model.id, pos=pos, value_added=value_added)
+        for (pos, (name, value_added)) in enumerate(data['sectors'])
+    ])
+    db.bulk_insert_mappings(models.Category, [
+        dict(name=name, model_id=model.id, pos=pos, description=name, unit='none')
+        for (pos, name) in enumerate(data['categories'])
+    ])
+    db.commit()
+    return model
+
+
+def import_years(workbooks: Dict[int, Tuple[str, str]], jobs: Optional[int] = None,
+                 cache_dir: Optional[str] = IBGE_CACHE_DIR) -> List[int]:
+    """Imports the given `{year: (book, va_book)}` workbooks, returning the years imported"""
+    db = SessionLocal()
+    try:
+        skipped = existing_years(db, list(workbooks))
+        for year in skipped:
+            logger.info("%s already imported, skipping", model_name(year))
+        pending = {year: files for (year, files) in workbooks.items() if year not in skipped}
+        imported = []
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(build_year, year, book_file, va_file, cache_dir)
+                       for (year, (book_file, va_file)) in pending.items()]
+            for future in as_completed(futures):
+                (year, data) = future.result()
+                store_model(db, year, data)
+                imported.append(year)
+                logger.info("%s imported", model_name(year))
+        return imported
+    finally:
+        db.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('directories', nargs='*', default=['.'],
+                        help="where to look for Matriz_de_Insumo_Produto_<year>_Nivel_67.ods and 68_tab2_<year>.ods")
+    parser.add_argument('-y', '--years', type=int, nargs='+', help="import only these years")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="number of parsing processes")
+    parser.add_argument('--download', action='store_true',
+                        help="fetch the workbooks of --years into the artifact store, instead of searching directories")
+    parser.add_argument('--store', default=ARTIFACT_DIR, help="artifact store directory")
+    parser.add_argument('--mirror', default=ARTIFACT_MIRROR,
+                        help="local mirror of ftp.ibge.gov.br to fetch from instead of the network")
+    parser.add_argument('--offline', action='store_true', help="only use files already in the store or the mirror")
+    parser.add_argument('--no-cache', action='store_true', help="do not cache converted workbooks")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.download:
+        if not args.years:
+            parser.error("--download requires --years")
+        store = ArtifactStore(args.store, args.mirror, args.offline)
+        try:
+            workbooks = {year: fetch_year(store, year) for year in args.years}
+        except ArtifactError as e:
+            parser.exit(1, f"{e}\n")
+    else:
+        workbooks = ibge.find_workbooks(args.directories)
+        if args.years:
+            workbooks = {year: files for (year, files) in workbooks.items() if year in args.years}
+    if not workbooks:
+        # The input-output matrix is only published for reference years, the tab1/tab2 tables of the
+        # other years are not enough to build a model
+        parser.error("no year with both workbooks was found, every year needs "
+                     "Matriz_de_Insumo_Produto_<year>_Nivel_67.ods besides 68_tab2_<year>.ods")
+
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    import_years(workbooks, args.jobs, None if args.no_cache else IBGE_CACHE_DIR)
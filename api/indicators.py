@@ -0,0 +1,31 @@
+"""
+Indicators derived from the Leontief matrix
+
+They are stored with each model and refreshed whenever its Leontief or
+impact matrix changes, see `models.refresh_indicators`.
+"""
+from typing import Optional, Tuple
+
+import numpy
+from numpy import ndarray
+
+# Rows of the linkage matrix
+OUTPUT_MULTIPLIERS, BACKWARD_LINKAGES, FORWARD_LINKAGES = range(3)
+
+
+def compute_indicators(leontief_matrix: ndarray, catimpct_matrix: ndarray) -> Tuple[ndarray, Optional[ndarray]]:
+    """
+    Returns the linkage matrix, whose rows are the output multipliers and the
+    Rasmussen–Hirschman backward and forward linkages of every sector, and
+    the category multipliers (`catimpct_matrix @ leontief_matrix`). The
+    latter is None when the impact matrix does not match the sectors.
+    """
+    size = leontief_matrix.shape[0]
+    multipliers = leontief_matrix.sum(axis=0)
+    total = multipliers.sum()
+    # Linkages are normalized by the average over all sectors, i.e. total / n
+    scale = size / total if total else 0.0
+    linkage_matrix = numpy.vstack([multipliers, multipliers * scale, leontief_matrix.sum(axis=1) * scale])
+    if catimpct_matrix.ndim != 2 or catimpct_matrix.shape[1] != size:
+        return linkage_matrix, None
+    return linkage_matrix, catimpct_matrix @ leontief_matrix
@@ -0,0 +1,127 @@
+"""
+Incremental updates of the Leontief inverse `L = (I - A)⁻¹`
+
+Edits to a model usually touch a few rows or columns of `A`. Instead of
+inverting `I - A` again, these helpers update the current inverse in O(n²k)
+with the Woodbury identity (coefficient edits) and bordered matrix inverses
+through the Schur complement (sector insertion and removal). When the update
+is ill-conditioned, or not cheaper than starting over, they fall back to a
+full inversion. The stored inverse is updated over and over, so rounding
+errors would accumulate: each updated inverse is checked against a few
+random vectors, in O(n²), and inverted again when its residual has drifted.
+"""
+from typing import Optional, Sequence
+
+import numpy
+from numpy import ndarray
+
+# Updates whose capacitance matrix (or Schur complement) is worse conditioned than this are recomputed
+CONDITION_LIMIT = 1e10
+# Updated inverses whose relative residual ‖(I - A) L x - x‖ / ‖x‖ exceeds this are recomputed
+RESIDUAL_LIMIT = 1e-9
+# Random vectors the residual is measured on
+RESIDUAL_SAMPLES = 4
+
+_rng = numpy.random.default_rng()
+
+
+def inverse(economic_matrix: ndarray) -> ndarray:
+    """Computes the Leontief matrix from scratch"""
+    return numpy.linalg.inv(numpy.eye(economic_matrix.shape[0]) - economic_matrix)
+
+
+def residual(leontief_matrix: ndarray, economic_matrix: ndarray) -> float:
+    """Largest relative residual of `leontief_matrix` as the inverse of `I - economic_matrix` on random vectors"""
+    size = economic_matrix.shape[0]
+    if size == 0:
+        return 0.0
+    probes = _rng.standard_normal((size, RESIDUAL_SAMPLES))
+    images = leontief_matrix @ probes
+    errors = images - economic_matrix @ images - probes
+    return float((numpy.linalg.norm(errors, axis=0) / numpy.linalg.norm(probes, axis=0)).max())
+
+
+def _checked(leontief_matrix: ndarray, economic_matrix: ndarray) -> ndarray:
+    if residual(leontief_matrix, economic_matrix) > RESIDUAL_LIMIT:
+        return inverse(economic_matrix)
+    return leontief_matrix
+
+
+def update_coefficients(leontief_matrix: ndarray, old_economic: ndarray, new_economic: ndarray,
+                        columns: Optional[Sequence[int]] = None) -> ndarray:
+    """
+    Returns the Leontief matrix of `new_economic`, given the one of
+    `old_economic`. Only the changed rows or columns (whichever are fewer)
+    enter the rank-k update, `columns` may be given when the edited columns
+    are already known.
+    """
+    if old_economic.shape != new_economic.shape or leontief_matrix.shape != old_economic.shape:
+        return inverse(new_economic)
+    delta = new_economic - old_economic
+    size = delta.shape[0]
+    if columns is None:
+        columns = numpy.flatnonzero(delta.any(axis=0))
+    rows = numpy.flatnonzero(delta.any(axis=1))
+    rank = min(len(rows), len(columns))
+    if rank == 0:
+        return leontief_matrix
+    if 3 * rank > size:
+        return inverse(new_economic)
+
+    # I - A' = (I - A) - U Vᵀ, so L' = L + L U (I - Vᵀ L U)⁻¹ Vᵀ L
+    if len(columns) <= len(rows):
+        columns = numpy.asarray(columns)
+        left = leontief_matrix @ delta[:, columns]
+        capacitance = numpy.eye(rank) - left[columns, :]
+        right = leontief_matrix[columns, :]
+    else:
+        left = leontief_matrix[:, rows]
+        right = delta[rows, :] @ leontief_matrix
+        capacitance = numpy.eye(rank) - right[:, rows]
+    if numpy.linalg.cond(capacitance) > CONDITION_LIMIT:
+        return inverse(new_economic)
+    return _checked(leontief_matrix + left @ numpy.linalg.solve(capacitance, right), new_economic)
+
+
+def insert_sector(leontief_matrix: ndarray, new_economic: ndarray, pos: int) -> ndarray:
+    """
+    Returns the Leontief matrix of `new_economic`, which is the previous
+    economic matrix with a sector inserted at `pos`
+    """
+    size = leontief_matrix.shape[0]
+    if new_economic.shape != (size + 1, size + 1):
+        return inverse(new_economic)
+    others = numpy.delete(numpy.arange(size + 1), pos)
+    # I - A' is the old I - A bordered by column b, row c and corner d
+    column = -new_economic[others, pos]
+    row = -new_economic[pos, others]
+    corner = 1 - new_economic[pos, pos]
+
+    l_column = leontief_matrix @ column
+    row_l = row @ leontief_matrix
+    schur = corner - row @ l_column
+    if abs(schur) * CONDITION_LIMIT <= max(abs(corner), abs(row @ l_column), 1):
+        return inverse(new_economic)
+
+    bordered = numpy.block([
+        [leontief_matrix + numpy.outer(l_column, row_l) / schur, -l_column[:, numpy.newaxis] / schur],
+        [-row_l[numpy.newaxis, :] / schur, numpy.array([[1 / schur]])],
+    ])
+    order = numpy.insert(numpy.arange(size), pos, size)
+    return _checked(bordered[numpy.ix_(order, order)], new_economic)
+
+
+def delete_sector(leontief_matrix: ndarray, new_economic: ndarray, pos: int) -> ndarray:
+    """
+    Returns the Leontief matrix of `new_economic`, which is the previous
+    economic matrix without the sector at `pos`
+    """
+    size = leontief_matrix.shape[0]
+    if new_economic.shape != (size - 1, size - 1):
+        return inverse(new_economic)
+    pivot = leontief_matrix[pos, pos]
+    if abs(pivot) * CONDITION_LIMIT <= numpy.abs(leontief_matrix).max():
+        return inverse(new_economic)
+    others = numpy.delete(numpy.arange(size), pos)
+    return _checked(leontief_matrix[numpy.ix_(others, others)]
+                    - numpy.outer(leontief_matrix[others, pos], leontief_matrix[pos, others]) / pivot, new_economic)
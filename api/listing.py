@@ -0,0 +1,96 @@
+"""
+Keyset pagination, name-prefix filters and field projection for list routes
+
+Pages are ordered by id: a page ends where `limit` rows were returned, and
+the id of its last row, sent in the `X-Next-After` header, is the `after`
+of the next page. Relationships returned are loaded for the whole page in
+one query each, and with `fields` only those columns are loaded and only
+the requested relationships are fetched.
+"""
+from typing import Iterable, List, Optional, Type
+
+from fastapi import HTTPException, Query as QueryParam, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+# pylint: disable=no-name-in-module
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import and_, inspect
+from sqlalchemy.orm import Query, load_only, selectinload
+
+from .database import Base
+
+MAX_PAGE_SIZE = 1000
+NEXT_HEADER = 'X-Next-After'
+
+
+class ListParams:
+    """Query parameters of list routes"""
+
+    def __init__(self,
+                 after: Optional[int] = QueryParam(None, description="Only rows after this id, see `X-Next-After`"),
+                 limit: Optional[int] = QueryParam(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum rows returned"),
+                 prefix: Optional[str] = QueryParam(None, min_length=1, description="Only names starting with this"),
+                 fields: Optional[str] = QueryParam(None, description="Comma-separated fields returned, all by default")):
+        self.after = after
+        self.limit = limit
+        self.prefix = prefix
+        self.fields = None if fields is None else [field.strip() for field in fields.split(',') if field.strip()]
+
+
+def starts_with(column, prefix: str):
+    """
+    Filters values of `column` starting with `prefix`, as a range on the
+    column, which its index can serve (LIKE is case-insensitive on SQLite)
+    """
+    if ord(prefix[-1]) == 0x10FFFF:
+        return column.startswith(prefix)
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def page(query: Query, entity: Type[Base], name_column, schema: Type[BaseModel], params: ListParams,
+         response: Response):
+    """
+    Runs `query` for the page described by `params`, returning the rows, or a
+    response with only `params.fields` of each row as validated by `schema`
+    """
+    if params.prefix is not None:
+        query = query.filter(starts_with(name_column, params.prefix))
+    if params.after is not None:
+        query = query.filter(entity.id > params.after)
+    query = query.order_by(entity.id)
+    if params.limit is not None:
+        query = query.limit(params.limit)
+    if params.fields is not None:
+        query = query.options(load_only(*projected_columns(entity, schema, params.fields)))
+    relationships = inspect(entity).relationships.keys()
+    returned = schema.__fields__ if params.fields is None else params.fields
+    query = query.options(*(selectinload(getattr(entity, name)) for name in returned if name in relationships))
+    rows = query.all()
+    next_after = str(rows[-1].id) if params.limit is not None and len(rows) == params.limit else None
+    if params.fields is None:
+        if next_after is not None:
+            response.headers[NEXT_HEADER] = next_after
+        return rows
+    return JSONResponse([project(schema, row, params.fields) for row in rows],
+                        headers=None if next_after is None else {NEXT_HEADER: next_after})
+
+
+def projected_columns(entity: Type[Base], schema: Type[BaseModel], fields: Iterable[str]) -> List[str]:
+    """Columns of `entity` to load for `fields`, raising 400 for fields not in `schema`"""
+    unknown = [field for field in fields if field not in schema.__fields__]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    columns = {attr.key for attr in inspect(entity).column_attrs}
+    return ['id', *(field for field in fields if field in columns and field != 'id')]
+
+
+def project(schema: Type[BaseModel], row, fields: Iterable[str]) -> dict:
+    """Validates only `fields` of an ORM row against `schema`"""
+    result = {}
+    for name in fields:
+        field = schema.__fields__[name]
+        value, errors = field.validate(getattr(row, name), {}, loc=name, cls=schema)
+        if errors:
+            raise ValidationError([errors], schema)
+        result[name] = value
+    return jsonable_encoder(result)
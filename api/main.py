@@ -1,25 +1,48 @@
 """
 Main API module
 """
+import asyncio
 from datetime import timedelta
 from typing import Dict, List
 
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from . import models
+from . import migrations, models, sweeper, workers
 from .database import Base, engine
 from .deps import get_db
 from .routers import user, model, role
-from .security import JwtToken, authenticate_user, ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token
+from .security import JwtToken, authenticate_user, ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_admin_user
+from .settings import TEMP_MODEL_TTL
 
 Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 app = FastAPI()
 
 
+@app.on_event("startup")
+async def start_sweeper():
+    if TEMP_MODEL_TTL > 0:
+        app.state.sweeper = asyncio.ensure_future(sweeper.run_periodically())
+
+
+@app.on_event("shutdown")
+async def stop_sweeper():
+    task = getattr(app.state, 'sweeper', None)
+    if task is not None:
+        task.cancel()
+
+
+@app.exception_handler(workers.PoolFull)
+async def pool_full(request: Request, exc: workers.PoolFull):
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": "Server busy, try again"},
+                        headers={"Retry-After": "1"})
+
+
 @app.get("/")
 def home():
     """
@@ -29,7 +52,7 @@ def home():
 
 
 @app.post("/login", response_model=JwtToken)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     db_user: models.User = authenticate_user(db, form_data.username, form_data.password)
     if not db_user:
         raise HTTPException(
@@ -44,6 +67,15 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@app.get("/workers", dependencies=[Depends(get_admin_user)])
+def worker_stats():
+    """
+    Returns, for each worker pool, its size and the number of tasks and
+    time spent waiting for and running in it since startup [Admin only]
+    """
+    return workers.stats()
+
+
 app.include_router(user.router, prefix='/users')
 app.include_router(model.router, prefix='/models')
 app.include_router(role.router, prefix='/roles')
@@ -0,0 +1,179 @@
+"""
+Migrations for databases created by older versions of the API
+
+`Base.metadata.create_all` only creates missing tables, so changes to
+existing tables and rows are registered here and applied once per
+database, in order, by `upgrade`.
+"""
+import pickle
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+import numpy
+from sqlalchemy import Column, DateTime, LargeBinary, String, Table, inspect, select, text, type_coerce
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateTable
+
+from . import models
+from .database import Base, MATRIX_MAGIC
+from .indicators import compute_indicators
+
+Migration = Callable[[Connection], None]
+
+MIGRATIONS: List[Tuple[str, Migration]] = []
+
+schema_migrations = Table('schema_migrations', Base.metadata,
+                          Column('name', String, primary_key=True),
+                          Column('applied_at', DateTime, nullable=False, default=datetime.utcnow),
+                          )
+
+
+def migration(name: str) -> Callable[[Migration], Migration]:
+    """Registers a migration, migrations run in the order they are declared"""
+    def register(func: Migration) -> Migration:
+        MIGRATIONS.append((name, func))
+        return func
+    return register
+
+
+def upgrade(bind: Engine):
+    """Applies every migration that was not yet applied to the database"""
+    schema_migrations.create(bind=bind, checkfirst=True)
+    with bind.connect() as conn:
+        sqlite = conn.dialect.name == 'sqlite'
+        if sqlite:
+            # Rebuilding a table must not fire the ON DELETE actions of tables referencing it,
+            # this can only be turned off outside of a transaction
+            conn.execute(text('PRAGMA foreign_keys=OFF'))
+        try:
+            with conn.begin():
+                applied = {row.name for row in conn.execute(select([schema_migrations.c.name]))}
+                for (name, func) in MIGRATIONS:
+                    if name in applied:
+                        continue
+                    func(conn)
+                    conn.execute(schema_migrations.insert().values(name=name))
+                if sqlite and conn.execute(text('PRAGMA foreign_key_check')).first() is not None:
+                    raise RuntimeError("Migrations left foreign key violations")
+        finally:
+            if sqlite:
+                conn.execute(text('PRAGMA foreign_keys=ON'))
+
+
+def rebuild_table(conn: Connection, table: Table):
+    """
+    Recreates an existing table as declared in the models, keeping its rows,
+    for changes SQLite cannot make with ALTER TABLE (e.g. dropping NOT NULL).
+    Only the columns the table already has are kept, columns declared since
+    are left to the later migrations adding them.
+    """
+    staging = f'{table.name}__new'
+    existing = [info['name'] for info in inspect(conn).get_columns(table.name)]
+    create = CreateTable(table)
+    create.columns = [column for column in create.columns if column.element.name in existing]
+    ddl = str(create.compile(dialect=conn.dialect))
+    conn.execute(text(ddl.replace(f'CREATE TABLE {table.name} ', f'CREATE TABLE {staging} ', 1)))
+    columns = ', '.join(existing)
+    conn.execute(text(f'INSERT INTO {staging} ({columns}) SELECT {columns} FROM {table.name}'))
+    conn.execute(text(f'DROP TABLE {table.name}'))
+    conn.execute(text(f'ALTER TABLE {staging} RENAME TO {table.name}'))
+    for index in table.indexes:
+        if all(column.name in existing for column in index.columns):
+            index.create(bind=conn)
+
+
+def add_column(conn: Connection, table: Table, column: Column):
+    """Adds a column declared in the models to an existing table, if missing"""
+    if column.name in {info['name'] for info in inspect(conn).get_columns(table.name)}:
+        return
+    ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}'
+    if column.server_default is not None:
+        ddl += f' DEFAULT {column.server_default.arg}'
+    if not column.nullable:
+        ddl += ' NOT NULL'
+    conn.execute(text(ddl))
+
+
+@migration('0001_unpickle_matrices')
+def unpickle_matrices(conn: Connection):
+    """Rewrites matrices stored with pickle using the raw matrix format"""
+    for table in (models.Model.__table__, models.TempModel.__table__):
+        columns = [table.c.economic_matrix, table.c.leontief_matrix, table.c.catimpct_matrix]
+        raw = select([table.c.id, *(type_coerce(column, LargeBinary).label(column.name) for column in columns)])
+        for row in conn.execute(raw).fetchall():
+            legacy = {column.name: row[column.name] for column in columns
+                      if row[column.name] is not None and not bytes(row[column.name]).startswith(MATRIX_MAGIC)}
+            if not legacy:
+                continue
+            # Only rows written by this API are unpickled, and only once
+            values = {name: numpy.asarray(pickle.loads(blob)) for (name, blob) in legacy.items()}
+            conn.execute(table.update().where(table.c.id == row.id).values(values))
+
+
+@migration('0002_model_versions')
+def add_model_versions(conn: Connection):
+    """Adds the version counter used by the model caches"""
+    for table in (models.Model.__table__, models.TempModel.__table__):
+        add_column(conn, table, table.c.version)
+
+
+@migration('0003_model_indicators')
+def add_model_indicators(conn: Connection):
+    """Adds and fills the precomputed indicator columns"""
+    for table in (models.Model.__table__, models.TempModel.__table__):
+        add_column(conn, table, table.c.linkage_matrix)
+        add_column(conn, table, table.c.catmult_matrix)
+        rows = conn.execute(select([table.c.id, table.c.leontief_matrix, table.c.catimpct_matrix])).fetchall()
+        for row in rows:
+            linkage_matrix, catmult_matrix = compute_indicators(row.leontief_matrix, row.catimpct_matrix)
+            conn.execute(table.update().where(table.c.id == row.id)
+                         .values(linkage_matrix=linkage_matrix, catmult_matrix=catmult_matrix))
+
+
+@migration('0004_temp_model_copy_on_write')
+def share_temp_model_matrices(conn: Connection):
+    """Makes the matrices of temporary models nullable, and drops the copies identical to their base model's"""
+    table = models.TempModel.__table__
+    if conn.dialect.name == 'sqlite':
+        rebuild_table(conn, table)
+    else:
+        for name in models.MATRICES:
+            conn.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN {name} DROP NOT NULL'))
+    for name in models.MATRICES:
+        conn.execute(text(f'UPDATE {table.name} SET {name} = NULL '
+                          f'WHERE {name} = (SELECT {name} FROM models WHERE models.id = {table.name}.model_id)'))
+    # Indicators only depend on the Leontief and impact matrices
+    conn.execute(text(f'UPDATE {table.name} SET linkage_matrix = NULL, catmult_matrix = NULL '
+                      'WHERE leontief_matrix IS NULL AND catimpct_matrix IS NULL'))
+
+
+@migration('0005_temp_model_last_accessed')
+def add_temp_model_last_accessed(conn: Connection):
+    """Adds the access time used to expire temporary models, starting their TTL now"""
+    table = models.TempModel.__table__
+    add_column(conn, table, table.c.last_accessed)
+    conn.execute(table.update().where(table.c.last_accessed.is_(None)).values(last_accessed=datetime.utcnow()))
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table.name}_last_accessed ON {table.name} (last_accessed)'))
+
+
+@migration('0006_model_roles_visibility_index')
+def add_model_roles_visibility_index(conn: Connection):
+    """Indexes model_roles by role, to list the models visible to a set of roles"""
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_model_roles_role_id_model_id ON model_roles (role_id, model_id)'))
+
+
+@migration('0007_model_generations')
+def add_model_generations(conn: Connection):
+    """Adds the random generation keying the caches, a new one for every existing row"""
+    for table in (models.Model.__table__, models.TempModel.__table__):
+        if table.c.generation.name not in {info['name'] for info in inspect(conn).get_columns(table.name)}:
+            # Nullable, SQLite cannot add a NOT NULL column without a constant default
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN generation VARCHAR(32)'))
+        for (row_id,) in conn.execute(select([table.c.id]).where(table.c.generation.is_(None))).fetchall():
+            conn.execute(table.update().where(table.c.id == row_id).values(generation=models.new_generation()))
+
+
+@migration('0008_roles_name_index')
+def add_roles_name_index(conn: Connection):
+    """Indexes roles by name, which orders and filters the role listing"""
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_roles_name ON roles (name)'))
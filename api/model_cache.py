@@ -0,0 +1,67 @@
+"""
+Process-wide cache of decoded models
+
+Entries hold what simulations need (matrices, sectors and categories) and are
+keyed by model id, generation and version. The version is bumped by every
+change, so a model changed by another process is never served stale, and the
+generation is random per row, so a model reusing the id of a deleted one
+never gets its entries. Routes that change a model must also call
+`invalidate`, which frees the entries of this process.
+"""
+from threading import Lock
+from typing import List, NamedTuple, Union
+
+from cachetools import LRUCache
+from numpy import ndarray
+
+from . import models, schemas
+from .settings import MODEL_CACHE_SIZE
+
+
+class CachedModel(NamedTuple):
+    """Decoded, read-only snapshot of a model"""
+
+    id: int
+    generation: str
+    version: int
+    economic_matrix: ndarray
+    leontief_matrix: ndarray
+    catimpct_matrix: ndarray
+    sectors: List[schemas.Sector]
+    categories: List[schemas.Category]
+
+
+_models: LRUCache = LRUCache(maxsize=MODEL_CACHE_SIZE)
+_models_lock = Lock()
+
+
+def load(model_id: int, model: Union[models.Model, models.TempModel]) -> CachedModel:
+    """
+    Returns the cached snapshot of `model`, decoding it on a miss. `model_id`
+    is the public identifier, negative for temporary models
+    """
+    key = (model_id, model.generation, model.version)
+    with _models_lock:
+        cached = _models.get(key)
+    if cached is not None:
+        return cached
+    cached = CachedModel(
+        id=model_id,
+        generation=model.generation,
+        version=model.version,
+        economic_matrix=model.economic_matrix,
+        leontief_matrix=model.leontief_matrix,
+        catimpct_matrix=model.catimpct_matrix,
+        sectors=[schemas.Sector.from_orm(s) for s in sorted(model.sectors, key=lambda s: s.pos)],
+        categories=[schemas.Category.from_orm(c) for c in sorted(model.categories, key=lambda c: c.pos)],
+    )
+    with _models_lock:
+        _models[key] = cached
+    return cached
+
+
+def invalidate(model_id: int):
+    """Drops every cached version of a model"""
+    with _models_lock:
+        for key in [key for key in _models if key[0] == model_id]:
+            del _models[key]
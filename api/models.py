@@ -1,7 +1,17 @@
-from sqlalchemy import Boolean, Float, Column, ForeignKey, Integer, String, Table
-from sqlalchemy.orm import relationship
+from datetime import datetime
+from itertools import chain
+from typing import Sequence
+from uuid import uuid4
+
+from sqlalchemy import Boolean, DateTime, Float, Column, ForeignKey, Index, Integer, String, Table, event, inspect, text
+from sqlalchemy.orm import Session, deferred, relationship
 
 from .database import Base, NumpyColumnType
+from .indicators import compute_indicators
+
+
+def new_generation() -> str:
+    return uuid4().hex
 
 
 class User(Base):
@@ -17,17 +27,17 @@ class User(Base):
     agreed_terms = Column(Boolean, nullable=False, default=False)
     institution = Column(String(200), nullable=True)
 
-    roles = relationship('Role', lazy='dynamic', secondary=lambda: user_roles)
+    roles = relationship('Role', secondary=lambda: user_roles, back_populates='users')
 
 
 class Role(Base):
     __tablename__ = "roles"
 
     id = Column(Integer, autoincrement=True, primary_key=True, index=True)
-    name = Column(String, nullable=False)
+    name = Column(String, index=True, nullable=False)
     description = Column(String)
 
-    users = relationship('User', lazy='dynamic', secondary=lambda: user_roles, passive_deletes=True)
+    users = relationship('User', secondary=lambda: user_roles, back_populates='roles', passive_deletes=True)
 
 
 user_roles = Table('user_roles', Base.metadata,
@@ -43,18 +53,30 @@ class Model(Base):
     name = Column(String, index=True, nullable=False)
     description = Column(String)
 
-    economic_matrix = Column(NumpyColumnType, nullable=False)
-    leontief_matrix = Column(NumpyColumnType, nullable=False)
-    catimpct_matrix = Column(NumpyColumnType, nullable=False)
+    # Matrices are only loaded by queries that undefer the 'matrices' group
+    economic_matrix = deferred(Column(NumpyColumnType, nullable=False), group='matrices')
+    leontief_matrix = deferred(Column(NumpyColumnType, nullable=False), group='matrices')
+    catimpct_matrix = deferred(Column(NumpyColumnType, nullable=False), group='matrices')
+    # Bumped on every change to the model, keys the in-memory caches
+    version = Column(Integer, nullable=False, default=0, server_default='0')
+    # Random per row, so caches keyed by id never confuse the model with a deleted one that had the same id
+    generation = Column(String(32), nullable=False, default=new_generation)
+
+    # Derived from the matrices above by `refresh_indicators`
+    linkage_matrix = deferred(Column(NumpyColumnType), group='indicators')
+    catmult_matrix = deferred(Column(NumpyColumnType), group='indicators')
 
     sectors = relationship("Sector", backref="model", cascade="all, delete-orphan", passive_deletes=True)
     categories = relationship("Category", backref="model", cascade="all, delete-orphan", passive_deletes=True)
-    roles = relationship('Role', lazy='dynamic', secondary=lambda: model_roles, passive_deletes=True)
+    roles = relationship('Role', secondary=lambda: model_roles, passive_deletes=True)
 
 
+# Also the visibility index of models: the primary key finds whether a model is visible
+# to some roles, and the (role_id, model_id) index lists the models visible to them
 model_roles = Table('model_roles', Base.metadata,
                     Column('model_id', Integer, ForeignKey(Model.id, ondelete="CASCADE"), primary_key=True),
                     Column('role_id', Integer, ForeignKey(Role.id), primary_key=True),
+                    Index('ix_model_roles_role_id_model_id', 'role_id', 'model_id'),
                     )
 
 
@@ -79,7 +101,48 @@ class Category(Base):
     unit = Column(String, nullable=False)
 
 
+def shared_matrix(name: str) -> property:
+    """
+    A matrix of a temporary model, which is its base model's until it is
+    first assigned, see `TempModel`
+    """
+    own = f'own_{name}'
+
+    def get(self):
+        value = getattr(self, own)
+        return getattr(self.base_model, name) if value is None else value
+
+    def set(self, value):
+        setattr(self, own, value)
+
+    return property(get, set)
+
+
+def shared_indicator(name: str) -> property:
+    """
+    An indicator of a temporary model, taken from the base model as long as
+    the model has no indicators of its own (the linkage matrix is not set)
+    """
+    own = f'own_{name}'
+
+    def get(self):
+        if self.own_linkage_matrix is None:
+            return getattr(self.base_model, name)
+        return getattr(self, own)
+
+    def set(self, value):
+        setattr(self, own, value)
+
+    return property(get, set)
+
+
 class TempModel(Base):
+    """
+    A user's copy of a model. Matrices are copied on write: the `own_*`
+    columns stay NULL, and the model reads its base model's matrices,
+    until they are first changed (see `materialize_clones` for changes to
+    the base model).
+    """
     __tablename__ = "temp_models"
 
     id = Column(Integer, autoincrement=True, primary_key=True, index=True)
@@ -87,10 +150,27 @@ class TempModel(Base):
     description = Column(String)
     model_id = Column(Integer, ForeignKey(Model.id), nullable=False)
     user_id = Column(Integer, ForeignKey(User.id), nullable=False)
-
-    economic_matrix = Column(NumpyColumnType, nullable=False)
-    leontief_matrix = Column(NumpyColumnType, nullable=False)
-    catimpct_matrix = Column(NumpyColumnType, nullable=False)
+    # Models unused for longer than TEMP_MODEL_TTL are deleted, see `sweeper`
+    last_accessed = Column(DateTime, default=datetime.utcnow, index=True)
+
+    # Matrices are only loaded by queries that undefer the 'matrices' group
+    own_economic_matrix = deferred(Column('economic_matrix', NumpyColumnType), group='matrices')
+    own_leontief_matrix = deferred(Column('leontief_matrix', NumpyColumnType), group='matrices')
+    own_catimpct_matrix = deferred(Column('catimpct_matrix', NumpyColumnType), group='matrices')
+    # Bumped on every change to the model, keys the in-memory caches
+    version = Column(Integer, nullable=False, default=0, server_default='0')
+    # Random per row, so caches keyed by id never confuse the model with a deleted one that had the same id
+    generation = Column(String(32), nullable=False, default=new_generation)
+
+    # Derived from the matrices above by `refresh_indicators`
+    own_linkage_matrix = deferred(Column('linkage_matrix', NumpyColumnType), group='indicators')
+    own_catmult_matrix = deferred(Column('catmult_matrix', NumpyColumnType), group='indicators')
+
+    economic_matrix = shared_matrix('economic_matrix')
+    leontief_matrix = shared_matrix('leontief_matrix')
+    catimpct_matrix = shared_matrix('catimpct_matrix')
+    linkage_matrix = shared_indicator('linkage_matrix')
+    catmult_matrix = shared_indicator('catmult_matrix')
 
     sectors = relationship("TempSector", backref="model", cascade="all, delete-orphan", passive_deletes=True)
     categories = relationship("TempCategory", backref="model", cascade="all, delete-orphan", passive_deletes=True)
@@ -117,3 +197,49 @@ class TempCategory(Base):
     pos = Column(Integer, nullable=False)
     description = Column(String, nullable=False)
     unit = Column(String, nullable=False)
+
+
+MATRICES = ('economic_matrix', 'leontief_matrix', 'catimpct_matrix')
+INDICATORS = ('linkage_matrix', 'catmult_matrix')
+
+
+def copy_base_matrices(session: Session, model_id: int, names: Sequence[str], unless: str):
+    """Copies matrices of a model into its temporary models where `unless` is still NULL"""
+    assignments = ', '.join(f'{name} = (SELECT {name} FROM models WHERE id = :model_id)' for name in names)
+    session.execute(text(f'UPDATE temp_models SET {assignments} WHERE model_id = :model_id AND {unless} IS NULL'),
+                    {'model_id': model_id})
+
+
+@event.listens_for(Session, 'before_flush')
+def materialize_clones(session: Session, _flush_context, _instances):
+    """
+    Gives temporary models their own copy of the matrices of their base
+    model that are about to change, while the old ones are still stored
+    """
+    for obj in session.dirty:
+        if not isinstance(obj, Model):
+            continue
+        state = inspect(obj)
+        changed = [name for name in MATRICES if state.attrs[name].history.has_changes()]
+        if 'leontief_matrix' in changed or 'catimpct_matrix' in changed:
+            # Indicators are shared as a whole, see `shared_indicator`
+            copy_base_matrices(session, obj.id, INDICATORS, 'linkage_matrix')
+        for name in changed:
+            copy_base_matrices(session, obj.id, [name], name)
+
+
+@event.listens_for(Session, 'before_flush')
+def refresh_indicators(session: Session, _flush_context, _instances):
+    """Recomputes the indicators of models whose Leontief or impact matrix changed"""
+    for obj in chain(session.new, session.dirty):
+        if not isinstance(obj, (Model, TempModel)):
+            continue
+        state = inspect(obj)
+        if state.pending:
+            changed = obj.linkage_matrix is None
+        else:
+            prefix = 'own_' if isinstance(obj, TempModel) else ''
+            changed = any(state.attrs[prefix + name].history.has_changes()
+                          for name in ('leontief_matrix', 'catimpct_matrix'))
+        if changed and obj.leontief_matrix is not None and obj.catimpct_matrix is not None:
+            obj.linkage_matrix, obj.catmult_matrix = compute_indicators(obj.leontief_matrix, obj.catimpct_matrix)
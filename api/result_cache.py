@@ -0,0 +1,121 @@
+"""
+Cache of simulation results
+
+Results are keyed by model id, generation and version (see
+`models.new_generation`) and a digest of the canonical
+simulation input, so a single simulation and a batch of one share entries,
+and results of a changed model are never served. They are kept in memory
+for RESULT_CACHE_TTL seconds and, when RESULT_CACHE_DIR is set, stored
+there too as `.npz` files, one directory per model. Routes that change a
+model must call `invalidate`; `prune` removes expired files.
+"""
+import os
+import shutil
+import time
+from hashlib import blake2b
+from threading import Lock
+from typing import Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+import numpy
+import orjson
+from cachetools import TTLCache
+from numpy import ndarray
+
+from .settings import RESULT_CACHE_DIR, RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+
+Result = Tuple[ndarray, ndarray]
+
+
+class ResultKey(NamedTuple):
+    model_id: int
+    generation: str
+    version: int
+    digest: str
+
+
+_results: TTLCache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+_results_lock = Lock()
+
+
+def result_key(model_id: int, generation: str, version: int, scenarios: List[Dict[int, float]],
+               change: Optional[List[List[float]]]) -> ResultKey:
+    """Keys the result of simulating `scenarios` on a model version, whatever the order of each scenario's sectors"""
+    canonical = [[sorted((int(idx), float(val)) for (idx, val) in values.items()) for values in scenarios], change]
+    return ResultKey(model_id, generation, version, blake2b(orjson.dumps(canonical), digest_size=16).hexdigest())
+
+
+def etag(key: ResultKey, variant: Hashable) -> str:
+    """Entity tag of a result rendered as `variant` (e.g. route and media type)"""
+    digest = blake2b(repr((tuple(key), variant)).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def get(key: ResultKey, cache_dir: Optional[str] = RESULT_CACHE_DIR) -> Optional[Result]:
+    """Returns a cached result, from memory or else from `cache_dir`"""
+    with _results_lock:
+        result = _results.get(key)
+    if result is not None or cache_dir is None:
+        return result
+    path = _path(cache_dir, key)
+    try:
+        if time.time() - os.path.getmtime(path) > RESULT_CACHE_TTL:
+            return None
+        with numpy.load(path, allow_pickle=False) as stored:
+            result = _frozen((stored['y'], stored['details']))
+    except (OSError, KeyError, ValueError):
+        return None
+    with _results_lock:
+        _results[key] = result
+    return result
+
+
+def put(key: ResultKey, result: Result, cache_dir: Optional[str] = RESULT_CACHE_DIR) -> Result:
+    """Caches a result, returning it read-only"""
+    result = _frozen(result)
+    with _results_lock:
+        _results[key] = result
+    if cache_dir is not None:
+        path = _path(cache_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f'{path}.{os.getpid()}.part'
+        with open(partial, 'wb') as file:
+            numpy.savez(file, y=result[0], details=result[1])
+        os.replace(partial, path)
+    return result
+
+
+def invalidate(model_id: int, cache_dir: Optional[str] = RESULT_CACHE_DIR):
+    """Drops every cached result of a model"""
+    with _results_lock:
+        for key in [key for key in _results if key.model_id == model_id]:
+            del _results[key]
+    if cache_dir is not None:
+        shutil.rmtree(os.path.join(cache_dir, str(model_id)), ignore_errors=True)
+
+
+def prune(cache_dir: Optional[str] = RESULT_CACHE_DIR) -> int:
+    """Deletes the stored results older than RESULT_CACHE_TTL, returning how many were deleted"""
+    if cache_dir is None or not os.path.isdir(cache_dir):
+        return 0
+    cutoff = time.time() - RESULT_CACHE_TTL
+    deleted = 0
+    for (directory, _, files) in os.walk(cache_dir):
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    deleted += 1
+            except OSError:
+                pass
+    return deleted
+
+
+def _path(cache_dir: str, key: ResultKey) -> str:
+    return os.path.join(cache_dir, str(key.model_id), f'{key.generation}-{key.version}-{key.digest}.npz')
+
+
+def _frozen(result: Result) -> Result:
+    for array in result:
+        array.setflags(write=False)
+    return result
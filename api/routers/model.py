@@ -1,50 +1,168 @@
 import numpy
 from numpy import ndarray
 
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from .. import crud, models
+from .. import crud, indicators, leontief, listing, model_cache, models, result_cache, schemas, simulation, workers
 from ..deps import get_db
-from ..schemas import Model, SimInput, SimOutput, ClonedModel, SectorCreate, CategoryCreate, CoefsInput, \
-    IdentifierModel, Sector, Category
-from ..security import get_current_user_optional, get_admin_user, get_current_user
+from ..listing import ListParams
+from ..responses import NPZ_MEDIA_TYPE, NPZ_RESPONSES, NpzResponse, NumpyJSONResponse, accepts, etag_matches
+from ..settings import FAST_JSON
+from ..schemas import Indicators, Model, ModelSummary, SimInput, SimBatchInput, SimOutput, \
+    ClonedModel, SectorCreate, CategoryCreate, CoefsInput, CoefsPatch, IdentifierModel, Sector, Category
+from ..auth_cache import Principal
+from ..security import get_admin_user, get_current_principal, get_principal
 
 router = APIRouter()
 
 
-@router.get('/list', response_model=List[Model],
-            response_model_exclude={'economic_matrix', 'leontief_matrix', 'catimpct_matrix', 'sectors'})
-def model_list(db: Session = Depends(get_db), db_user: Optional[models.User] = Depends(get_current_user_optional)):
+def apply_patch(matrix: ndarray, patch: CoefsPatch) -> ndarray:
+    """Returns a copy of the matrix with the patch applied, rows first, then columns, then cells"""
+    patched = numpy.array(matrix, dtype=numpy.float64)
+    try:
+        for (idx, values) in patch.rows.items():
+            if idx < 0 or len(values) != patched.shape[1]:
+                raise IndexError()
+            patched[idx, :] = values
+        for (idx, values) in patch.columns.items():
+            if idx < 0 or len(values) != patched.shape[0]:
+                raise IndexError()
+            patched[:, idx] = values
+        for cell in patch.cells:
+            if cell.row < 0 or cell.col < 0:
+                raise IndexError()
+            patched[cell.row, cell.col] = cell.value
+    except IndexError:
+        # pylint: disable=raise-missing-from
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    return patched
+
+
+def matrix_arrays(model: Union[models.Model, models.TempModel], *matrices: str) -> Dict[str, ndarray]:
+    """Collects the matrices of a model as raw arrays, all three by default"""
+    matrices = matrices or ('economic_matrix', 'leontief_matrix', 'catimpct_matrix')
+    return {matrix: getattr(model, matrix) for matrix in matrices}
+
+
+def name_arrays(model: Union[models.Model, models.TempModel]) -> Dict[str, ndarray]:
+    """Sector and category names of a model in position order, labeling the arrays of an `NpzResponse`"""
+    return {
+        'sectors': numpy.array([s.name for s in sorted(model.sectors, key=lambda s: s.pos)], dtype=str),
+        'categories': numpy.array([c.name for c in sorted(model.categories, key=lambda c: c.pos)], dtype=str),
+    }
+
+
+def insert_sector(economic_matrix: ndarray, leontief_matrix: ndarray, catimpct_matrix: ndarray,
+                  sector: SectorCreate) -> Tuple[ndarray, ndarray, ndarray]:
+    """Returns the three matrices of a model with a new sector inserted at `sector.pos`"""
+    economic_matrix = numpy.insert(economic_matrix, sector.pos, numpy.array(sector.reverse), 1)
+    economic_matrix = numpy.insert(economic_matrix, sector.pos, numpy.array(sector.direct), 0)
+    leontief_matrix = leontief.insert_sector(leontief_matrix, economic_matrix, sector.pos)
+    catimpct_matrix = numpy.insert(catimpct_matrix, sector.pos, numpy.array(sector.impacts), 1)
+    return economic_matrix, leontief_matrix, catimpct_matrix
+
+
+def delete_sector(economic_matrix: ndarray, leontief_matrix: ndarray, catimpct_matrix: ndarray,
+                  pos: int) -> Tuple[ndarray, ndarray, ndarray]:
+    """Returns the three matrices of a model without the sector at `pos`"""
+    economic_matrix = numpy.delete(numpy.delete(economic_matrix, pos, 0), pos, 1)
+    leontief_matrix = leontief.delete_sector(leontief_matrix, economic_matrix, pos)
+    catimpct_matrix = numpy.delete(catimpct_matrix, pos, 1)
+    return economic_matrix, leontief_matrix, catimpct_matrix
+
+
+def model_changed(model_id: int):
+    """Drops cached data of a model, must be called once its changes are committed"""
+    model_cache.invalidate(model_id)
+    simulation.invalidate(model_id)
+    result_cache.invalidate(model_id)
+
+
+def fetch_matrices(db: Session, model_id: int, principal: Principal) -> \
+        Tuple[Union[models.Model, models.TempModel], Tuple[ndarray, ndarray, ndarray]]:
+    """The model with its three matrices, for async routes to hand them to the compute pool, 404 if not found"""
+    model = crud.fetch_model(db, model_id, principal, with_matrices=True)
+    if model is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return model, (model.economic_matrix, model.leontief_matrix, model.catimpct_matrix)
+
+
+def commit_matrices(db: Session, model_id: int, model: Union[models.Model, models.TempModel], **matrices: ndarray):
+    """Stores new matrices of a model together with the pending changes of `db`"""
+    for (name, matrix) in matrices.items():
+        setattr(model, name, matrix)
+    crud.touch_model(model)
+    db.commit()
+    model_changed(model_id)
+    db.flush()
+
+
+@router.get('/list', response_model=List[ModelSummary])
+def model_list(response: Response, params: ListParams = Depends(), db: Session = Depends(get_db),
+               principal: Principal = Depends(get_principal)):
     """
     Lists all models that logged-in user has access
     [Admin: lists all models]
     """
-    if db_user is not None and crud.is_user_admin(db, db_user):
-        return crud.get_models_filtered_role(db, None, True)
-    current_roles = crud.query_user_role_list(db, db_user.id) if db_user is not None else crud.query_guest_role(db)
-    return crud.get_models_filtered_role(db, current_roles)
+    query = crud.query_models_filtered_role(db, principal.role_ids, principal.admin)
+    return listing.page(query, models.Model, models.Model.name, ModelSummary, params, response)
 
 
-@router.get('/{model_id}/get', response_model=Model)
+@router.get('/{model_id}/get', response_model=Model, responses=NPZ_RESPONSES)
 def detail_model(model_id: int, db: Session = Depends(get_db),
-                 db_user: Optional[models.User] = Depends(get_current_user_optional)):
+                 principal: Principal = Depends(get_principal),
+                 accept: Optional[str] = Header(None)):
     """
     Returns data for model, including the full matrices
     """
     if model_id < 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    if db_user is not None and crud.is_user_admin(db, db_user):
-        return crud.get_model(db, model_id, None, True)
-    current_roles = crud.query_user_role_list(db, db_user.id) if db_user is not None else crud.query_guest_role(db)
-    model = crud.get_model(db, model_id, current_roles)
+    model = crud.get_model(db, model_id, principal.role_ids, principal.admin, with_matrices=True)
     if model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if accepts(accept, NPZ_MEDIA_TYPE):
+        return NpzResponse({**matrix_arrays(model), **name_arrays(model)})
+    if FAST_JSON:
+        return NumpyJSONResponse({
+            **schemas.ModelSummary.from_orm(model).dict(),
+            "sectors": [schemas.Sector.from_orm(s) for s in model.sectors],
+            **matrix_arrays(model),
+        })
     return model
 
 
+@router.get('/{model_id}/indicators', response_model=Indicators, responses=NPZ_RESPONSES)
+def model_indicators(model_id: int, db: Session = Depends(get_db),
+                     principal: Principal = Depends(get_principal),
+                     accept: Optional[str] = Header(None)):
+    """
+    Returns the output multipliers, backward and forward linkages and
+    category multipliers of every sector, without the full matrices
+    """
+    model = crud.fetch_model(db, model_id, principal)
+    if model is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    linkage_matrix = model.linkage_matrix
+    if linkage_matrix is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Indicators not computed")
+    result = {
+        "output_multipliers": linkage_matrix[indicators.OUTPUT_MULTIPLIERS],
+        "backward_linkages": linkage_matrix[indicators.BACKWARD_LINKAGES],
+        "forward_linkages": linkage_matrix[indicators.FORWARD_LINKAGES],
+        "category_multipliers": model.catmult_matrix,
+    }
+    if accepts(accept, NPZ_MEDIA_TYPE):
+        arrays = {name: value for (name, value) in result.items() if value is not None}
+        return NpzResponse({**arrays, **name_arrays(model)})
+    result["sectors"] = [schemas.Sector.from_orm(s) for s in sorted(model.sectors, key=lambda s: s.pos)]
+    result["categories"] = [schemas.Category.from_orm(c) for c in sorted(model.categories, key=lambda c: c.pos)]
+    return NumpyJSONResponse(result) if FAST_JSON else result
+
+
 @router.post('/new', response_model=Model, dependencies=[Depends(get_admin_user)])
 def new_model(name: str, role_ids: List[int], description: Optional[str] = None, db: Session = Depends(get_db)):
     new_model = models.Model(name=name, description=description)
@@ -61,38 +179,35 @@ def new_model(name: str, role_ids: List[int], description: Optional[str] = None,
 
 @router.post('/{model_id}/modify')
 def modify_model(model_id: int, name: Optional[str], description: Optional[str], db: Session = Depends(get_db),
-                 db_user: models.User = Depends(get_admin_user)):
-    model = crud.fetch_model(db, model_id, db_user)
+                 principal: Principal = Depends(get_admin_user)):
+    model = crud.fetch_model(db, model_id, principal)
     if model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     if name is not None:
         model.name = name
     if description is not None:
         model.description = description
+    crud.touch_model(model)
     db.commit()
+    model_changed(model_id)
     db.flush()
 
 
 # noinspection PyUnresolvedReferences,PyTypeChecker
-@router.post('/{model_id}/clone', response_model=ClonedModel)
+@router.post('/{model_id}/clone', response_model=ClonedModel, responses=NPZ_RESPONSES)
 def clone_model(model_id: int, db: Session = Depends(get_db),
-                db_user: models.User = Depends(get_current_user)):
+                principal: Principal = Depends(get_current_principal), accept: Optional[str] = Header(None)):
     """
     Create a new temporary model from a base model.
     Logged-in user becomes the owner of this model and can make changes.
     """
     if model_id < 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    if crud.is_user_admin(db, db_user):
-        model = crud.get_model(db, model_id, None, True)
-    else:
-        current_roles = crud.query_user_role_list(db, db_user.id)
-        model = crud.get_model(db, model_id, current_roles)
+    model = crud.get_model(db, model_id, principal.role_ids, principal.admin, with_matrices=True)
     if model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    tmp = models.TempModel(name=model.name, description=model.description, model_id=model.id,
-                           economic_matrix=model.economic_matrix, leontief_matrix=model.leontief_matrix,
-                           catimpct_matrix=model.catimpct_matrix, owner=db_user)
+    # Matrices are shared with the base model until they are changed
+    tmp = models.TempModel(name=model.name, description=model.description, base_model=model, user_id=principal.id)
     db.add(tmp)
     tmp.sectors.extend(
         map(lambda s: models.TempSector(name=s.name, pos=s.pos, value_added=s.value_added),
@@ -102,27 +217,31 @@ def clone_model(model_id: int, db: Session = Depends(get_db),
         model.categories))
     db.commit()
     db.flush()
-    return {
+    if accepts(accept, NPZ_MEDIA_TYPE):
+        return NpzResponse({"id": numpy.array(-tmp.id), **matrix_arrays(tmp, 'economic_matrix', 'catimpct_matrix'),
+                            **name_arrays(tmp)})
+    cloned = {
         "id": -tmp.id,
         "name": tmp.name,
         "description": tmp.description,
-        "sectors": tmp.sectors,
-        "categories": tmp.categories,
+        "sectors": [schemas.Sector.from_orm(s) for s in tmp.sectors],
+        "categories": [schemas.Category.from_orm(c) for c in tmp.categories],
         "economic_matrix": tmp.economic_matrix,
         "catimpct_matrix": tmp.catimpct_matrix,
     }
+    return NumpyJSONResponse(cloned) if FAST_JSON else cloned
 
 
 # noinspection PyUnresolvedReferences,PyTypeChecker
 @router.post('/{model_id}/persist', response_model=IdentifierModel)
 def persist_model(model_id: int, db: Session = Depends(get_db),
-                  db_user: models.User = Depends(get_current_user)):
+                  principal: Principal = Depends(get_current_principal)):
     """
     Converts temporary model to a regular model
     """
     if model_id >= 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    tmp_model = crud.get_temporary_model(db, -model_id, db_user, crud.is_user_admin(db, db_user))
+    tmp_model = crud.get_temporary_model(db, -model_id, principal.id, principal.admin, with_matrices=True)
     if tmp_model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     new_model = models.Model(name=tmp_model.name, description=tmp_model.description,
@@ -135,79 +254,146 @@ def persist_model(model_id: int, db: Session = Depends(get_db),
     new_model.categories.extend(map(
         lambda c: models.Category(name=c.name, pos=c.pos, description=c.description, unit=c.unit),
         tmp_model.categories))
-    new_model.roles.extend(tmp_model.base_model.roles.all())
+    new_model.roles.extend(tmp_model.base_model.roles)
     db.delete(tmp_model)
     db.commit()
     db.flush()
+    model_changed(model_id)
     return {
       "id": new_model.id,
     }
 
 
-@router.post('/{model_id}/simulate', response_model=SimOutput)
-def model_sim(model_id: int, values: SimInput,
-              db: Session = Depends(get_db), db_user: Optional[models.User] = Depends(get_current_user_optional)):
+def run_simulation(model: model_cache.CachedModel, scenarios: List[Dict[int, float]],
+                   change: Optional[List[List[float]]]) -> Tuple[ndarray, ndarray]:
     """
-    Run a simulation using the model and the input vector
-
+    Simulates every demand scenario against the model in a single pass,
+    returning the production (`sectors × scenarios`) and its breakdown by
+    category (`scenarios × sectors × categories`)
     """
-    model = crud.fetch_model(db, model_id, db_user)
-    if model is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    if values.change is not None:
-        change = numpy.array(values.change, dtype=numpy.float)
+    try:
+        x = simulation.demand_matrix(model.leontief_matrix.shape[0], scenarios)
+    except IndexError:
+        # pylint: disable=raise-missing-from
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    if change is not None:
+        change = numpy.array(change, dtype=numpy.float64)
         if change.shape != model.leontief_matrix.shape:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
-        # noinspection PyPep8Naming
-        A: ndarray = (1+change)*model.economic_matrix
-        L: ndarray = numpy.linalg.inv(numpy.eye(A.shape[0])-A)
+        factors = simulation.factorize(model.id, model.generation, model.version, model.economic_matrix, change)
+        y: ndarray = simulation.solve(factors, x)
     else:
-        # noinspection PyPep8Naming
-        L: ndarray = model.leontief_matrix
+        y: ndarray = model.leontief_matrix @ x
+    return y, simulation.detail_impacts(y, model.catimpct_matrix)
 
-    x = numpy.zeros((L.shape[0], 1), dtype=numpy.float)
-    for (idx, val) in values.values.items():
-        if idx > x.size:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
-        x[idx, 0] = val
-    # noinspection PyTypeChecker
-    categories_sorted = sorted(model.categories, key=lambda c: c.pos)
-    y: ndarray = L @ x
-    details: ndarray = y * model.catimpct_matrix.T
-    return {
-        "categories": categories_sorted,
-        "result": numpy.squeeze(y).tolist(),
-        "detailed": details.tolist()
-    }
 
+def simulation_outputs(model: model_cache.CachedModel, y: ndarray, details: ndarray) -> List[dict]:
+    """Formats the results of `run_simulation` as one `SimOutput` per scenario"""
+    return [{
+        "categories": model.categories,
+        "result": result,
+        "detailed": detailed
+    } for (result, detailed) in zip(y.T, details)]
 
-@router.post('/{model_id}/sector/new')
-def model_new_sector(model_id: int, sector: SectorCreate,
-                     db: Session = Depends(get_db),
-                     db_user: Optional[models.User] = Depends(get_current_user_optional)):
-    model = crud.fetch_model(db, model_id, db_user)
+
+async def cached_simulation(key: result_cache.ResultKey, model: model_cache.CachedModel,
+                            scenarios: List[Dict[int, float]],
+                            change: Optional[List[List[float]]]) -> Tuple[ndarray, ndarray]:
+    """`run_simulation` on the compute pool, unless its result is in `result_cache`"""
+    result = await run_in_threadpool(result_cache.get, key)
+    if result is None:
+        result = await workers.run_async(lambda: result_cache.put(key, run_simulation(model, scenarios, change)))
+    return result
+
+
+@router.post('/{model_id}/simulate', response_model=SimOutput, responses=NPZ_RESPONSES)
+async def model_sim(model_id: int, values: SimInput, response: Response,
+              db: Session = Depends(get_db), principal: Principal = Depends(get_principal),
+              accept: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    """
+    Run a simulation using the model and the input vector, results are
+    cached and tagged, requests with a matching If-None-Match get a 304
+    """
+    model = await run_in_threadpool(crud.fetch_model, db, model_id, principal)
     if model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    if sector.pos > model.economic_matrix.shape[1]:
+    npz = accepts(accept, NPZ_MEDIA_TYPE)
+    key = result_cache.result_key(model_id, model.generation, model.version, [values.values], values.change)
+    tag = result_cache.etag(key, ("single", npz))
+    if etag_matches(if_none_match, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+    cached = await run_in_threadpool(model_cache.load, model_id, model)
+    y, details = await cached_simulation(key, cached, [values.values], values.change)
+    if npz:
+        return NpzResponse({
+            "categories": numpy.array([c.name for c in cached.categories], dtype=str),
+            "result": y[:, 0],
+            "detailed": details[0],
+        }, headers={"ETag": tag})
+    output = simulation_outputs(cached, y, details)[0]
+    if FAST_JSON:
+        return NumpyJSONResponse(output, headers={"ETag": tag})
+    response.headers["ETag"] = tag
+    return output
+
+
+@router.post('/{model_id}/simulate/batch', response_model=List[SimOutput], responses=NPZ_RESPONSES)
+async def model_sim_batch(model_id: int, values: SimBatchInput, response: Response,
+                    db: Session = Depends(get_db),
+                    principal: Principal = Depends(get_principal),
+                    accept: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    """
+    Run several simulations on the same model, one per input vector
+    """
+    model = await run_in_threadpool(crud.fetch_model, db, model_id, principal)
+    if model is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    npz = accepts(accept, NPZ_MEDIA_TYPE)
+    key = result_cache.result_key(model_id, model.generation, model.version, values.scenarios, values.change)
+    tag = result_cache.etag(key, ("batch", npz))
+    if etag_matches(if_none_match, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+    cached = await run_in_threadpool(model_cache.load, model_id, model)
+    y, details = await cached_simulation(key, cached, values.scenarios, values.change)
+    if npz:
+        return NpzResponse({
+            "categories": numpy.array([c.name for c in cached.categories], dtype=str),
+            "result": y.T,
+            "detailed": details,
+        }, headers={"ETag": tag})
+    outputs = simulation_outputs(cached, y, details)
+    if FAST_JSON:
+        return NumpyJSONResponse(outputs, headers={"ETag": tag})
+    response.headers["ETag"] = tag
+    return outputs
+
+
+@router.post('/{model_id}/sector/new')
+async def model_new_sector(model_id: int, sector: SectorCreate,
+                           db: Session = Depends(get_db),
+                           principal: Principal = Depends(get_principal)):
+    model, matrices = await run_in_threadpool(fetch_matrices, db, model_id, principal)
+    if sector.pos > matrices[0].shape[1]:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
-    cls = models.TempSector if model_id < 0 else models.Sector
-    # noinspection PyArgumentList
-    new_sector = cls(name=sector.name, model_id=model.id, pos=sector.pos, value_added=sector.value_added)
-    db.query(cls).filter_by(model_id=model.id).filter(cls.pos >= new_sector.pos).update({'pos': cls.pos + 1})
-    db.add(new_sector)
-    model.economic_matrix = numpy.insert(model.economic_matrix, new_sector.pos, numpy.array(sector.reverse), 1)
-    model.economic_matrix = numpy.insert(model.economic_matrix, new_sector.pos, numpy.array(sector.direct), 0)
-    model.leontief_matrix = numpy.linalg.inv(numpy.eye(model.economic_matrix.shape[0]) - model.economic_matrix)
-    model.catimpct_matrix = numpy.insert(model.catimpct_matrix, new_sector.pos, numpy.array(sector.impacts), 1)
-    db.commit()
-    db.flush()
+    economic_matrix, leontief_matrix, catimpct_matrix = await workers.run_async(insert_sector, *matrices, sector)
+
+    def store():
+        cls = models.TempSector if model_id < 0 else models.Sector
+        # noinspection PyArgumentList
+        new_sector = cls(name=sector.name, model_id=model.id, pos=sector.pos, value_added=sector.value_added)
+        db.query(cls).filter_by(model_id=model.id).filter(cls.pos >= new_sector.pos).update({'pos': cls.pos + 1})
+        db.add(new_sector)
+        commit_matrices(db, model_id, model, economic_matrix=economic_matrix, leontief_matrix=leontief_matrix,
+                        catimpct_matrix=catimpct_matrix)
+
+    await run_in_threadpool(store)
 
 
 @router.post('/{model_id}/sector/{sector_pos}/modify', response_model=Sector)
 def model_modify_sector(model_id: int, sector_pos: int, name: Optional[str] = None, value_added: Optional[float] = None,
                         db: Session = Depends(get_db),
-                        db_user: Optional[models.User] = Depends(get_current_user_optional)):
-    model = crud.fetch_model(db, model_id, db_user)
+                        principal: Principal = Depends(get_principal)):
+    model = crud.fetch_model(db, model_id, principal)
     if model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     cls = models.TempSector if model_id < 0 else models.Sector
@@ -219,62 +405,104 @@ def model_modify_sector(model_id: int, sector_pos: int, name: Optional[str] = No
     if value_added is not None:
         sector.value_added = value_added
 
+    crud.touch_model(model)
     db.commit()
+    model_changed(model_id)
     db.flush()
     return sector
 
 
 @router.delete('/{model_id}/sector/{sector_pos}')
-def model_delete_sector(model_id: int, sector_pos: int,
-                        db: Session = Depends(get_db),
-                        db_user: Optional[models.User] = Depends(get_current_user_optional)):
-    model = crud.fetch_model(db, model_id, db_user)
-    if model is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+async def model_delete_sector(model_id: int, sector_pos: int,
+                              db: Session = Depends(get_db),
+                              principal: Principal = Depends(get_principal)):
     cls = models.TempSector if model_id < 0 else models.Sector
-    sector = db.query(cls).filter_by(model_id=model.id, pos=sector_pos).scalar()
-    if sector is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    db.query(cls).filter_by(model_id=model.id) \
-        .filter(cls.pos >= sector_pos).update({'pos': cls.pos - 1})
-    db.delete(sector)
-    model.economic_matrix = numpy.delete(model.economic_matrix, sector_pos, 0)
-    model.economic_matrix = numpy.delete(model.economic_matrix, sector_pos, 1)
-    model.leontief_matrix = numpy.linalg.inv(numpy.eye(model.economic_matrix.shape[0]) - model.economic_matrix)
-    model.catimpct_matrix = numpy.delete(model.catimpct_matrix, sector_pos, 1)
-    db.commit()
-    db.flush()
+    def fetch():
+        model, matrices = fetch_matrices(db, model_id, principal)
+        sector = db.query(cls).filter_by(model_id=model.id, pos=sector_pos).scalar()
+        if sector is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        return model, sector, matrices
+
+    model, sector, matrices = await run_in_threadpool(fetch)
+    economic_matrix, leontief_matrix, catimpct_matrix = await workers.run_async(delete_sector, *matrices, sector_pos)
+
+    def store():
+        db.query(cls).filter_by(model_id=model.id) \
+            .filter(cls.pos >= sector_pos).update({'pos': cls.pos - 1})
+        db.delete(sector)
+        commit_matrices(db, model_id, model, economic_matrix=economic_matrix, leontief_matrix=leontief_matrix,
+                        catimpct_matrix=catimpct_matrix)
+
+    await run_in_threadpool(store)
 
 
 @router.post('/{model_id}/coefs/update')
-def model_coefs_update(model_id: int, coefs: CoefsInput, db: Session = Depends(get_db),
-                       db_user: Optional[models.User] = Depends(get_current_user_optional)):
-    model = crud.fetch_model(db, model_id, db_user)
+async def model_coefs_update(model_id: int, coefs: CoefsInput, db: Session = Depends(get_db),
+                             principal: Principal = Depends(get_principal)):
+    model, (old_economic, leontief_matrix, _) = await run_in_threadpool(fetch_matrices, db, model_id, principal)
+    economic_matrix = numpy.array(coefs.values, dtype=numpy.float64)
+    if economic_matrix.shape != old_economic.shape:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    leontief_matrix = await workers.run_async(leontief.update_coefficients, leontief_matrix, old_economic,
+                                              economic_matrix)
+    await run_in_threadpool(commit_matrices, db, model_id, model, economic_matrix=economic_matrix,
+                            leontief_matrix=leontief_matrix)
+
+
+@router.post('/{model_id}/coefs/patch')
+async def model_coefs_patch(model_id: int, patch: CoefsPatch, db: Session = Depends(get_db),
+                            principal: Principal = Depends(get_principal)):
+    """
+    Changes only the given coefficients, the Leontief matrix is updated
+    with a cost proportional to the number of changed rows or columns.
+    The matrices are still loaded with the model and copied whole, O(n²),
+    the cached arrays of the model are never patched in place.
+    """
+    model, (old_economic, leontief_matrix, _) = await run_in_threadpool(fetch_matrices, db, model_id, principal)
+    economic_matrix = apply_patch(old_economic, patch)
+    leontief_matrix = await workers.run_async(leontief.update_coefficients, leontief_matrix, old_economic,
+                                              economic_matrix)
+    await run_in_threadpool(commit_matrices, db, model_id, model, economic_matrix=economic_matrix,
+                            leontief_matrix=leontief_matrix)
+
+
+@router.post('/{model_id}/impacts/update')
+def model_impacts_update(model_id: int, coefs: CoefsInput, db: Session = Depends(get_db),
+                         principal: Principal = Depends(get_principal)):
+    model = crud.fetch_model(db, model_id, principal)
     if model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    model.economic_matrix = numpy.array(coefs.values, dtype=numpy.float)
-    model.leontief_matrix = numpy.linalg.inv(numpy.eye(model.economic_matrix.shape[0]) - model.economic_matrix)
+    model.catimpct_matrix = numpy.array(coefs.values, dtype=numpy.float64)
+    crud.touch_model(model)
     db.commit()
+    model_changed(model_id)
     db.flush()
 
 
-@router.post('/{model_id}/impacts/update')
-def model_impacts_update(model_id: int, coefs: CoefsInput, db: Session = Depends(get_db),
-                         db_user: Optional[models.User] = Depends(get_current_user_optional)):
-    model = crud.fetch_model(db, model_id, db_user)
+@router.post('/{model_id}/impacts/patch')
+def model_impacts_patch(model_id: int, patch: CoefsPatch, db: Session = Depends(get_db),
+                        principal: Principal = Depends(get_principal)):
+    """
+    Changes only the given impact coefficients, in a whole copy of the
+    matrix loaded with the model (the cached arrays are never patched in place)
+    """
+    model = crud.fetch_model(db, model_id, principal, with_matrices=True)
     if model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    model.catimpct_matrix = numpy.array(coefs.values, dtype=numpy.float)
+    model.catimpct_matrix = apply_patch(model.catimpct_matrix, patch)
+    crud.touch_model(model)
     db.commit()
+    model_changed(model_id)
     db.flush()
 
 
 @router.post('/{model_id}/impact/new')
 def model_new_impact(model_id: int, category: CategoryCreate,
                      db: Session = Depends(get_db),
-                     db_user: Optional[models.User] = Depends(get_current_user_optional)):
-    model = crud.fetch_model(db, model_id, db_user)
+                     principal: Principal = Depends(get_principal)):
+    model = crud.fetch_model(db, model_id, principal, with_matrices=True)
     if model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     cls = models.TempCategory if model_id < 0 else models.Category
@@ -285,15 +513,17 @@ def model_new_impact(model_id: int, category: CategoryCreate,
         cls.pos >= new_category.pos).update({'pos': cls.pos + 1})
     db.add(new_category)
     model.catimpct_matrix = numpy.insert(model.catimpct_matrix, new_category.pos, numpy.array(category.impacts), 0)
+    crud.touch_model(model)
     db.commit()
+    model_changed(model_id)
     db.flush()
 
 
 @router.post('/{model_id}/impact/{impact_pos}/modify', response_model=Category)
 def model_modify_sector(model_id: int, impact_pos: int, name: Optional[str] = None, description: Optional[str] = None,
                         unit: Optional[str] = None, db: Session = Depends(get_db),
-                        db_user: Optional[models.User] = Depends(get_current_user_optional)):
-    model = crud.fetch_model(db, model_id, db_user)
+                        principal: Principal = Depends(get_principal)):
+    model = crud.fetch_model(db, model_id, principal)
     if model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     cls = models.TempCategory if model_id < 0 else models.Category
@@ -307,15 +537,17 @@ def model_modify_sector(model_id: int, impact_pos: int, name: Optional[str] = No
     if unit is not None:
         category.unit = unit
 
+    crud.touch_model(model)
     db.commit()
+    model_changed(model_id)
     db.flush()
     return category
 
 @router.delete('/{model_id}/impact/{impact_pos}')
 def model_delete_impact(model_id: int, impact_pos: int,
                         db: Session = Depends(get_db),
-                        db_user: Optional[models.User] = Depends(get_current_user_optional)):
-    model = crud.fetch_model(db, model_id, db_user)
+                        principal: Principal = Depends(get_principal)):
+    model = crud.fetch_model(db, model_id, principal, with_matrices=True)
     if model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     cls = models.TempCategory if model_id < 0 else models.Category
@@ -326,7 +558,9 @@ def model_delete_impact(model_id: int, impact_pos: int,
     db.query(cls).filter_by(model_id=model.id).filter(cls.pos >= impact_pos).update({'pos': cls.pos - 1})
     db.delete(category)
     model.catimpct_matrix = numpy.delete(model.catimpct_matrix, impact_pos, 0)
+    crud.touch_model(model)
     db.commit()
+    model_changed(model_id)
     db.flush()
 
 
@@ -357,15 +591,17 @@ def remove_model_roles(model_id: int, role_ids: List[int], db: Session = Depends
 
 
 @router.delete('/{model_id}', dependencies=[Depends(get_admin_user)])
-def remove_model_roles(model_id: int, db: Session = Depends(get_db), db_user: models.User = Depends(get_current_user)):
+def remove_model_roles(model_id: int, db: Session = Depends(get_db),
+                       principal: Principal = Depends(get_current_principal)):
     if model_id >= 0:
-        if not crud.is_user_admin(db, db_user):
+        if not principal.admin:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
         db_model: models.Model = db.query(models.Model).filter_by(id=model_id).scalar()
     else:
-        db_model: models.TempModel = db.query(models.TempModel).filter_by(id=-model_id, user_id=db_user.id).scalar()
+        db_model: models.TempModel = db.query(models.TempModel).filter_by(id=-model_id, user_id=principal.id).scalar()
     if db_model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     db.delete(db_model)
     db.commit()
     db.flush()
+    model_changed(model_id)
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from typing import List
 
-from .. import crud, models
+from .. import crud, listing, models
 from ..deps import get_db
-from ..schemas import Model, Role, RoleCreate, User
+from ..listing import ListParams
+from ..schemas import ModelSummary, Role, RoleCreate, User
 from ..security import get_admin_user
 
 router = APIRouter()
@@ -12,21 +13,22 @@ router = APIRouter()
 
 @router.get('/list', response_model=List[Role],
             dependencies=[Depends(get_admin_user)])
-def list_all_roles(db: Session = Depends(get_db)):
-    return db.query(models.Role).all()
+def list_all_roles(response: Response, params: ListParams = Depends(), db: Session = Depends(get_db)):
+    return listing.page(db.query(models.Role), models.Role, models.Role.name, Role, params, response)
 
 
 @router.get('/{role_id}/users', response_model=List[User],
             dependencies=[Depends(get_admin_user)])
-def list_users(role_id: int, db: Session = Depends(get_db)):
-    return db.query(models.User).join(models.user_roles).filter_by(role_id=role_id).all()
+def list_users(role_id: int, response: Response, params: ListParams = Depends(), db: Session = Depends(get_db)):
+    query = db.query(models.User).join(models.user_roles).filter_by(role_id=role_id)
+    return listing.page(query, models.User, models.User.username, User, params, response)
 
 
-@router.get('/{role_id}/models', response_model=List[Model],
-            response_model_exclude={'economic_matrix', 'leontief_matrix', 'sectors'},
+@router.get('/{role_id}/models', response_model=List[ModelSummary],
             dependencies=[Depends(get_admin_user)])
-def list_users(role_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Model).join(models.model_roles).filter_by(role_id=role_id).all()
+def list_users(role_id: int, response: Response, params: ListParams = Depends(), db: Session = Depends(get_db)):
+    query = db.query(models.Model).join(models.model_roles).filter_by(role_id=role_id)
+    return listing.page(query, models.Model, models.Model.name, ModelSummary, params, response)
 
 
 @router.post('/create', status_code=status.HTTP_201_CREATED, response_model=Role,
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from typing import List
 
-from .. import models
+from .. import auth_cache, listing, models
 from ..deps import get_db
+from ..listing import ListParams
 from ..schemas import User, UserCreate, UserPassword
 from ..security import get_current_user, get_admin_user, get_password_hash, verify_password
 
@@ -82,11 +83,11 @@ def update_self(user: User, db: Session = Depends(get_db),
 
 @router.get('/list', response_model=List[User],
             dependencies=[Depends(get_admin_user)])
-def list_all_users(db: Session = Depends(get_db)):
+def list_all_users(response: Response, params: ListParams = Depends(), db: Session = Depends(get_db)):
     """
-    Lists all users [Admin only]
+    Lists all users, `prefix` filters usernames [Admin only]
     """
-    return db.query(models.User).all()
+    return listing.page(db.query(models.User), models.User, models.User.username, User, params, response)
 
 
 @router.get('/{user_id}/details', response_model=User, dependencies=[Depends(get_admin_user)])
@@ -125,6 +126,7 @@ def add_user_roles(user_id: int, role_ids: List[int], db: Session = Depends(get_
     new_roles: list[models.Role] = db.query(models.Role).filter(models.Role.id.in_(role_ids)).all()
     db_user.roles.extend(new_roles)
     db.commit()
+    auth_cache.invalidate(db_user.username)
     db.flush()
 
 
@@ -141,4 +143,5 @@ def remove_user_roles(user_id: int, role_ids: List[int], db: Session = Depends(g
             .where(models.user_roles.c.role_id.in_(role_ids)))
     db.execute(stmt)
     db.commit()
+    auth_cache.invalidate(db_user.username)
     db.flush()
@@ -7,7 +7,8 @@ from typing import List, Optional, Dict
 # pylint: disable=no-name-in-module
 import numpy
 from pydantic import BaseModel, EmailStr, SecretStr, validator
-from sqlalchemy.orm import Query
+
+from .settings import MAX_BATCH_SCENARIOS
 
 
 class RoleBase(BaseModel):
@@ -48,10 +49,6 @@ class User(UserBase):
     institution: Optional[str]
     roles: List[Role]
 
-    @validator('roles', pre=True)
-    def fetch_dynamic(cls, value):
-        return value.all() if isinstance(value, Query) else value
-
     class Config:
         """Class used to provide configurations to Pydantic"""
 
@@ -110,22 +107,23 @@ class Category(CategoryBase):
         orm_mode = True
 
 
-class ModelBase(BaseModel):
-    """Class base for Model"""
+class ModelInfo(BaseModel):
+    """Class base for Model, without sectors and matrices"""
 
     name: str
     description: Optional[str]
-    sectors: List[Sector]
     categories: List[Category]
-    economic_matrix: List[List[float]]
-    leontief_matrix: List[List[float]]
-    catimpct_matrix: List[List[float]]
 
     roles: List[Role]
 
-    @validator('roles', pre=True)
-    def fetch_dynamic(cls, value):
-        return value.all() if isinstance(value, Query) else value
+
+class ModelBase(ModelInfo):
+    """Class base for Model"""
+
+    sectors: List[Sector]
+    economic_matrix: List[List[float]]
+    leontief_matrix: List[List[float]]
+    catimpct_matrix: List[List[float]]
 
     @validator('economic_matrix', 'leontief_matrix', 'catimpct_matrix', pre=True)
     def convert_numpy(cls, value):
@@ -147,20 +145,75 @@ class Model(ModelBase):
         orm_mode = True
 
 
+class ModelSummary(ModelInfo):
+    """Class Model schema for listings, matrices are never loaded"""
+
+    id: int
+
+    class Config:
+        """Class used to provide configurations to Pydantic"""
+
+        orm_mode = True
+
+
+class Indicators(BaseModel):
+    """Precomputed indicators of a model, indexed by sector position"""
+
+    sectors: List[Sector]
+    categories: List[Category]
+    output_multipliers: List[float]
+    backward_linkages: List[float]
+    forward_linkages: List[float]
+    category_multipliers: Optional[List[List[float]]]
+
+    @validator('output_multipliers', 'backward_linkages', 'forward_linkages', 'category_multipliers', pre=True)
+    def convert_numpy(cls, value):
+        return value.tolist() if isinstance(value, numpy.ndarray) else value
+
+
 class SimInput(BaseModel):
     values: Dict[int, float]
     change: Optional[List[List[float]]]
 
 
+class SimBatchInput(BaseModel):
+    scenarios: List[Dict[int, float]]
+    change: Optional[List[List[float]]]
+
+    @validator('scenarios')
+    def limit_scenarios(cls, value):
+        # The response holds every scenario's results, it is built in memory at once
+        if len(value) > MAX_BATCH_SCENARIOS:
+            raise ValueError(f"at most {MAX_BATCH_SCENARIOS} scenarios per batch")
+        return value
+
+
 class CoefsInput(BaseModel):
     values: List[List[float]]
 
 
+class CoefsCell(BaseModel):
+    row: int
+    col: int
+    value: float
+
+
+class CoefsPatch(BaseModel):
+    """Sparse edit of a matrix, by single cells and/or whole rows and columns"""
+    cells: List[CoefsCell] = []
+    rows: Dict[int, List[float]] = {}
+    columns: Dict[int, List[float]] = {}
+
+
 class SimOutput(BaseModel):
     categories: List[Category]
     result: List[float]
     detailed: List[List[float]]
 
+    @validator('result', 'detailed', pre=True)
+    def convert_numpy(cls, value):
+        return value.tolist() if isinstance(value, numpy.ndarray) else value
+
 
 class ClonedModel(BaseModel):
     """Used for returning a temporary model"""
@@ -12,7 +12,8 @@ from pydantic import BaseModel
 from sqlalchemy import literal
 from sqlalchemy.orm import Session
 
-from . import crud
+from . import auth_cache, crud, workers
+from .auth_cache import Principal
 from .deps import get_db
 from .models import User, Role, Model
 
@@ -36,11 +37,11 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
 
 
 def verify_password(plain_password: Union[str, bytes], hashed_password: Union[str, bytes]) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return workers.passwords.run(pwd_context.verify, plain_password, hashed_password)
 
 
 def get_password_hash(password: Union[str, bytes]) -> str:
-    return pwd_context.hash(password)
+    return workers.passwords.run(pwd_context.hash, password)
 
 
 def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
@@ -66,43 +67,86 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> \
-        Optional[User]:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    if token is None:
-        return None
+
+
+def token_username(token: str) -> str:
+    """Returns the username a token was issued to, raising 401 if it is invalid or expired"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise _credentials_exception()
         token_data = JwtData(username=username)
     except JWTError:
         # pylint: disable=raise-missing-from
-        raise credentials_exception
-    db_user = db.query(User).filter_by(username=token_data.username, enabled=True).first()
+        raise _credentials_exception()
+    return token_data.username
+
+
+def resolve_principal(db: Session, username: Optional[str]) -> Optional[Principal]:
+    """
+    Returns the id, admin flag and roles of an enabled user, or of anonymous
+    requests if `username` is None, from `auth_cache` when possible
+    """
+    principal = auth_cache.get(username or auth_cache.ANONYMOUS)
+    if principal is not None:
+        return principal
+    if username is None:
+        principal = Principal(id=None, admin=False, role_ids=frozenset(r for (r,) in crud.query_guest_role(db)))
+    else:
+        db_user = db.query(User).filter_by(username=username, enabled=True).first()
+        if db_user is None:
+            return None
+        principal = Principal(id=db_user.id, admin=crud.is_user_admin(db, db_user),
+                              role_ids=frozenset(r for (r,) in crud.query_user_role_list(db, db_user.id)))
+    auth_cache.put(username or auth_cache.ANONYMOUS, principal)
+    return principal
+
+
+# Dependencies querying the database are plain functions, FastAPI runs them in
+# its threadpool instead of blocking the event loop
+def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> \
+        Optional[User]:
+    if token is None:
+        return None
+    db_user = db.query(User).filter_by(username=token_username(token), enabled=True).first()
     if db_user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return db_user
 
 
 async def get_current_user(db_user: Optional[User] = Depends(get_current_user_optional)) -> User:
     if db_user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
     return db_user
 
 
-async def get_admin_user(db_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> User:
-    if crud.is_user_admin(db, db_user):
-        return db_user
+def get_principal(token: Optional[str] = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    """
+    Returns who makes the request, anonymous without a token. Unlike
+    `get_current_user_optional` it makes no queries while the user is cached
+    """
+    principal = resolve_principal(db, None if token is None else token_username(token))
+    if principal is None:
+        raise _credentials_exception()
+    return principal
+
+
+async def get_current_principal(principal: Principal = Depends(get_principal)) -> Principal:
+    if principal.id is None:
+        raise _credentials_exception()
+    return principal
+
+
+async def get_admin_user(principal: Principal = Depends(get_current_principal)) -> Principal:
+    if principal.admin:
+        return principal
     else:
         raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,85 @@
+"""
+Simulation engine for the Leontief model
+
+Simulations solve `(I - A) y = x` for a demand vector `x`. When the request
+changes the technical coefficients, the LU factorization of `I - A` is cached
+per (model id, generation and version, change matrix) so repeated scenarios skip the
+O(n³) step.
+"""
+from hashlib import blake2b
+from threading import Lock
+from typing import Dict, Hashable, List, Tuple
+
+import numpy
+from cachetools import LRUCache
+from numpy import ndarray
+from scipy.linalg import lu_factor, lu_solve
+
+from .settings import LU_CACHE_SIZE
+
+LuFactors = Tuple[ndarray, ndarray]
+
+_factors: LRUCache = LRUCache(maxsize=LU_CACHE_SIZE)
+_factors_lock = Lock()
+
+
+def matrix_digest(matrix: ndarray) -> str:
+    """Returns a stable digest for the contents and shape of a matrix"""
+    matrix = numpy.ascontiguousarray(matrix, dtype=numpy.float64)
+    digest = blake2b(repr(matrix.shape).encode(), digest_size=16)
+    digest.update(matrix.data)
+    return digest.hexdigest()
+
+
+def factorize(model_id: Hashable, generation: str, version: int, economic_matrix: ndarray,
+              change: ndarray) -> LuFactors:
+    """
+    Returns the LU factorization of `I - (1 + change) * A`, reusing a cached
+    one when the same change matrix was already applied to this model version
+    """
+    key = (model_id, generation, version, matrix_digest(change))
+    with _factors_lock:
+        factors = _factors.get(key)
+    if factors is None:
+        a_matrix = (1 + change) * economic_matrix
+        factors = lu_factor(numpy.eye(a_matrix.shape[0]) - a_matrix)
+        with _factors_lock:
+            _factors[key] = factors
+    return factors
+
+
+def invalidate(model_id: Hashable):
+    """Drops every cached factorization of a model, must be called when its coefficients change"""
+    with _factors_lock:
+        for key in [key for key in _factors if key[0] == model_id]:
+            del _factors[key]
+
+
+def solve(factors: LuFactors, demand: ndarray) -> ndarray:
+    """Solves `(I - A) y = demand` given the factorization of `I - A`"""
+    return lu_solve(factors, demand)
+
+
+def demand_matrix(size: int, scenarios: List[Dict[int, float]]) -> ndarray:
+    """
+    Stacks sparse demand vectors into a `size × len(scenarios)` matrix,
+    one column per scenario
+
+    Raises:
+        IndexError: when a sector index is outside the model
+    """
+    demand = numpy.zeros((size, len(scenarios)), dtype=numpy.float64)
+    for (col, values) in enumerate(scenarios):
+        for (idx, val) in values.items():
+            if not 0 <= idx < size:
+                raise IndexError(f"Sector {idx} is out of range")
+            demand[idx, col] = val
+    return demand
+
+
+def detail_impacts(production: ndarray, catimpct_matrix: ndarray) -> ndarray:
+    """
+    Breaks the production of every scenario (columns of `production`) down by
+    impact category, returning a `scenarios × sectors × categories` array
+    """
+    return production.T[:, :, numpy.newaxis] * catimpct_matrix.T[numpy.newaxis, :, :]
@@ -0,0 +1,105 @@
+"""
+Deletes temporary models nobody used for longer than TEMP_MODEL_TTL
+
+Reads of a temporary model store the time of the access (`record_access`),
+at most once every ACCESS_WRITE_INTERVAL seconds per model, so sweeps of
+any process see the accesses of all of them. Expired models are deleted
+in batches, their sectors and categories by the foreign key cascades,
+and the freed pages are then returned to the filesystem.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import model_cache, models, result_cache, simulation
+from .database import SessionLocal, engine
+from .settings import ACCESS_WRITE_INTERVAL, SWEEP_INTERVAL, TEMP_MODEL_TTL
+
+logger = logging.getLogger(__name__)
+
+# Number of temporary models deleted per transaction
+BATCH_SIZE = 200
+
+
+def record_access(db: Session, model: models.TempModel, interval: int = ACCESS_WRITE_INTERVAL):
+    """
+    Stores that a temporary model is used now, unless its stored access is
+    less than `interval` seconds old. The update is committed on a
+    connection of its own, leaving the transaction of `db` alone.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=interval)
+    if model.last_accessed is not None and model.last_accessed > stale:
+        return
+    table = models.TempModel.__table__
+    with db.get_bind().begin() as conn:
+        conn.execute(table.update()
+                     .where(table.c.id == model.id)
+                     .where(or_(table.c.last_accessed.is_(None), table.c.last_accessed <= stale))
+                     .values(last_accessed=now))
+    set_committed_value(model, 'last_accessed', now)
+
+
+def sweep(db: Session, ttl: int = TEMP_MODEL_TTL) -> int:
+    """Deletes the temporary models unused for `ttl` seconds, returning how many were deleted"""
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    deleted = 0
+    while True:
+        ids = [temp_id for (temp_id,) in db.query(models.TempModel.id)
+               .filter(models.TempModel.last_accessed < cutoff)
+               .limit(BATCH_SIZE)]
+        if not ids:
+            return deleted
+        db.query(models.TempModel).filter(models.TempModel.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        for temp_id in ids:
+            model_cache.invalidate(-temp_id)
+            simulation.invalidate(-temp_id)
+            result_cache.invalidate(-temp_id)
+        deleted += len(ids)
+
+
+def vacuum(bind: Engine):
+    """
+    Returns free pages to the filesystem. The first run switches SQLite
+    databases to incremental auto-vacuum, which requires a full VACUUM.
+    """
+    if bind.dialect.name != 'sqlite':
+        return
+    # executescript runs `incremental_vacuum` to completion, execute would free a single page
+    conn = bind.raw_connection()
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            conn.executescript('PRAGMA auto_vacuum=INCREMENTAL; VACUUM;')
+        else:
+            conn.executescript('PRAGMA incremental_vacuum;')
+    finally:
+        conn.close()
+
+
+def run_once():
+    db = SessionLocal()
+    try:
+        deleted = sweep(db)
+    finally:
+        db.close()
+    if deleted:
+        logger.info("Deleted %d expired temporary models", deleted)
+        vacuum(engine)
+    result_cache.prune()
+
+
+async def run_periodically(interval: int = SWEEP_INTERVAL):
+    """Sweeps every `interval` seconds, in a worker thread, until cancelled"""
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, run_once)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Sweeping temporary models failed")
@@ -0,0 +1,126 @@
+"""
+Bounded thread pools for the CPU-bound work of requests
+
+Routes run in the server's threadpool, which is sized for waiting on the
+database rather than for CPU-bound work. Simulations and matrix updates are
+handed to the `compute` pool instead, so at most COMPUTE_WORKERS of them run
+at once (NumPy releases the GIL, so they do run in parallel) and the others
+queue, instead of all of them competing for the cores. Async routes await
+them with `run_async`, holding no thread of the server while they wait. Password hashing
+runs on its own `passwords` pool, which rejects work once PASSWORD_QUEUE
+tasks are waiting, so a burst of logins fails fast instead of piling up.
+"""
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from time import perf_counter
+from typing import Callable, Dict, Optional, TypeVar
+
+from .settings import COMPUTE_WORKERS, PASSWORD_QUEUE, PASSWORD_WORKERS
+
+T = TypeVar('T')
+
+
+class PoolFull(Exception):
+    """Raised when a pool already has as many tasks waiting as its queue allows"""
+
+
+class Pool:
+    """
+    Thread pool whose `run` waits for the result of a task, with an optional
+    limit on the number of waiting tasks and counters of the time spent
+    waiting for a thread and running
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: Optional[int] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = None if max_queue is None else BoundedSemaphore(max_workers + max_queue)
+        self._lock = Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Runs `func` on the pool and waits for its result, exceptions are
+        raised in the caller. Arguments must not be lazy-loaded ORM
+        attributes, sessions are not shared between threads.
+        """
+        return self._submit(func, *args, **kwargs).result()
+
+    async def run_async(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """`run` for coroutines, which wait for the result without blocking the event loop"""
+        return await asyncio.wrap_future(self._submit(func, *args, **kwargs))
+
+    def _submit(self, func: Callable[..., T], *args, **kwargs) -> 'Future[T]':
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PoolFull(self.name)
+        with self._lock:
+            self._pending += 1
+        queued = perf_counter()
+
+        def timed():
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._record(started - queued, perf_counter() - started)
+                self._release()
+
+        future = self._executor.submit(timed)
+        # A task cancelled while queued, when its awaiting coroutine is, never runs `timed`
+        future.add_done_callback(lambda task: self._release() if task.cancelled() else None)
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def _record(self, waited: float, ran: float):
+        with self._lock:
+            self._completed += 1
+            self._wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+            self._run_seconds += ran
+
+    def stats(self) -> Dict[str, float]:
+        """Counters since the pool was created"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "wait_seconds": self._wait_seconds,
+                "max_wait_seconds": self._max_wait_seconds,
+                "run_seconds": self._run_seconds,
+            }
+
+
+compute = Pool('compute', COMPUTE_WORKERS)
+passwords = Pool('passwords', PASSWORD_WORKERS, PASSWORD_QUEUE)
+
+
+def run(func: Callable[..., T], *args, **kwargs) -> T:
+    """Runs `func` on the `compute` pool, see `Pool.run`"""
+    return compute.run(func, *args, **kwargs)
+
+
+async def run_async(func: Callable[..., T], *args, **kwargs) -> T:
+    """Runs `func` on the `compute` pool, see `Pool.run_async`"""
+    return await compute.run_async(func, *args, **kwargs)
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    return {pool.name: pool.stats() for pool in (compute, passwords)}
@@ -0,0 +1,32 @@
+"""
+Compares building the Z and A matrices of the 2015 IBGE model as lists and
+DataFrames (`build_z_matrix`, `build_a_matrix`) and as arrays
+(`z_matrix_arrays`, `a_matrix_arrays`)
+
+Usage: python -m benchmarks.matrices [repetitions]
+"""
+import sys
+from timeit import Timer
+
+import numpy
+
+from api import ibge
+
+
+def main(repetitions: int):
+    book = ibge.stream_book("tests/Matriz_de_Insumo_Produto_2015_Nivel_67.ods", ibge.MIP_SHEETS)
+    va_book = ibge.stream_book("tests/68_tab2_2015.ods", ibge.VA_SHEETS)
+    assert numpy.array_equal(ibge.build_a_matrix(book, va_book).to_numpy(), ibge.a_matrix_arrays(book, va_book)[2])
+
+    cases = [
+        ("z matrix", lambda: ibge.build_z_matrix(book, va_book), lambda: ibge.z_matrix_arrays(book, va_book)),
+        ("a matrix", lambda: ibge.build_a_matrix(book, va_book), lambda: ibge.a_matrix_arrays(book, va_book)),
+    ]
+    for (name, current, arrays) in cases:
+        current_ms = min(Timer(current).repeat(5, repetitions)) / repetitions * 1000
+        arrays_ms = min(Timer(arrays).repeat(5, repetitions)) / repetitions * 1000
+        print(f"{name:>10}: lists {current_ms:8.3f} ms  arrays {arrays_ms:8.3f} ms  ({current_ms / arrays_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,79 @@
+"""
+Compares the JSON serialization of the model and simulation routes, through
+FastAPI's response model validation and through `NumpyJSONResponse`, on the
+2015 IBGE model
+
+Usage: python -m benchmarks.serialization [repetitions]
+"""
+import asyncio
+import sys
+from os import environ
+from timeit import Timer
+from types import SimpleNamespace
+
+import numpy
+import pyexcel as p
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+environ.setdefault('HIDS_JWT_SECRET_KEY', 'benchmark')
+
+# pylint: disable=wrong-import-position
+from api import ibge, schemas, simulation
+from api.responses import NumpyJSONResponse
+
+
+def load_model():
+    book = p.get_book(file_name="tests/Matriz_de_Insumo_Produto_2015_Nivel_67.ods")
+    va_book = p.get_book(file_name="tests/68_tab2_2015.ods")
+    added_value = ibge.get_added_value(va_book)
+    production = numpy.array(added_value[-2][1:], dtype=numpy.float64)
+    a_matrix = ibge.get_marketshare(book) @ ibge.get_national_supply_demand(book) / production
+    cats = numpy.array([ibge.get_imports(book), ibge.get_taxes(book), *(row[1:] for row in added_value)],
+                       dtype=numpy.float64) / production
+    sectors = [SimpleNamespace(id=i, model_id=1, name=name, pos=i, value_added=production[i])
+               for (i, name) in enumerate(ibge.load_sectors(book))]
+    categories = [SimpleNamespace(id=i, model_id=1, name=str(i), pos=i, description="", unit="none")
+                  for i in range(cats.shape[0])]
+    return SimpleNamespace(id=1, name="IBGE 2015", description=None, roles=[], sectors=sectors,
+                           categories=categories, economic_matrix=a_matrix,
+                           leontief_matrix=numpy.linalg.inv(numpy.eye(a_matrix.shape[0]) - a_matrix),
+                           catimpct_matrix=cats)
+
+
+def pydantic_path(schema, content):
+    field = create_response_field(name="Response", type_=schema)
+    loop = asyncio.new_event_loop()
+    return lambda: JSONResponse(loop.run_until_complete(serialize_response(field=field, response_content=content)))
+
+
+def main(repetitions: int):
+    model = load_model()
+    model_payload = {
+        **schemas.ModelSummary.from_orm(model).dict(),
+        "sectors": [schemas.Sector.from_orm(s) for s in model.sectors],
+        "economic_matrix": model.economic_matrix,
+        "leontief_matrix": model.leontief_matrix,
+        "catimpct_matrix": model.catimpct_matrix,
+    }
+    production = model.leontief_matrix @ numpy.ones((model.leontief_matrix.shape[0], 1))
+    sim_payload = {
+        "categories": [schemas.Category.from_orm(c) for c in model.categories],
+        "result": production[:, 0],
+        "detailed": simulation.detail_impacts(production, model.catimpct_matrix)[0],
+    }
+    cases = [
+        ("get", pydantic_path(schemas.Model, model), lambda: NumpyJSONResponse(model_payload)),
+        ("simulate", pydantic_path(schemas.SimOutput, sim_payload), lambda: NumpyJSONResponse(sim_payload)),
+    ]
+    for (name, current, fast) in cases:
+        assert len(current().body) > 0 and len(fast().body) > 0
+        current_ms = min(Timer(current).repeat(5, repetitions)) / repetitions * 1000
+        fast_ms = min(Timer(fast).repeat(5, repetitions)) / repetitions * 1000
+        print(f"{name:>10}: pydantic {current_ms:8.3f} ms  orjson {fast_ms:8.3f} ms  "
+              f"({current_ms / fast_ms:.1f}x), {len(fast().body)} bytes")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
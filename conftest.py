@@ -0,0 +1,39 @@
+"""
+Fixtures shared by the tests
+"""
+import os
+
+from pytest import fixture
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# The settings of `api.security` require a secret, set before any test imports it
+os.environ.setdefault('HIDS_JWT_SECRET_KEY', 'test')
+
+# pylint: disable=wrong-import-position
+from api.database import Base
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def db():
+    """
+    Session on an empty in-memory database, test modules add their rows by
+    overriding it. Every thread shares its connection, as routes under a
+    test client run in other threads.
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@fixture
+def count_queries(db):
+    """Statements run on the database of `db` from now on, as a list"""
+    queries = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: queries.append(args[2]))
+    return queries
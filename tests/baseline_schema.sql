@@ -0,0 +1,111 @@
+-- Schema created by the first version of the API, before any migration
+CREATE TABLE users (
+	id INTEGER NOT NULL,
+	username VARCHAR(64) NOT NULL,
+	firstname VARCHAR(100) NOT NULL,
+	lastname VARCHAR(200) NOT NULL,
+	email VARCHAR(200) NOT NULL,
+	password VARCHAR NOT NULL,
+	enabled BOOLEAN NOT NULL,
+	agreed_terms BOOLEAN NOT NULL,
+	institution VARCHAR(200),
+	PRIMARY KEY (id)
+);
+CREATE INDEX ix_users_id ON users (id);
+CREATE INDEX ix_users_firstname ON users (firstname);
+CREATE INDEX ix_users_email ON users (email);
+CREATE INDEX ix_users_lastname ON users (lastname);
+CREATE INDEX ix_users_username ON users (username);
+CREATE TABLE roles (
+	id INTEGER NOT NULL,
+	name VARCHAR NOT NULL,
+	description VARCHAR,
+	PRIMARY KEY (id)
+);
+CREATE INDEX ix_roles_id ON roles (id);
+CREATE TABLE models (
+	id INTEGER NOT NULL,
+	name VARCHAR NOT NULL,
+	description VARCHAR,
+	economic_matrix BLOB NOT NULL,
+	leontief_matrix BLOB NOT NULL,
+	catimpct_matrix BLOB NOT NULL,
+	PRIMARY KEY (id)
+);
+CREATE INDEX ix_models_id ON models (id);
+CREATE INDEX ix_models_name ON models (name);
+CREATE TABLE user_roles (
+	user_id INTEGER NOT NULL,
+	role_id INTEGER NOT NULL,
+	PRIMARY KEY (user_id, role_id),
+	FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE,
+	FOREIGN KEY(role_id) REFERENCES roles (id)
+);
+CREATE TABLE model_roles (
+	model_id INTEGER NOT NULL,
+	role_id INTEGER NOT NULL,
+	PRIMARY KEY (model_id, role_id),
+	FOREIGN KEY(model_id) REFERENCES models (id) ON DELETE CASCADE,
+	FOREIGN KEY(role_id) REFERENCES roles (id)
+);
+CREATE TABLE sectors (
+	id INTEGER NOT NULL,
+	name VARCHAR(100) NOT NULL,
+	model_id INTEGER NOT NULL,
+	pos INTEGER NOT NULL,
+	value_added FLOAT NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(model_id) REFERENCES models (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_sectors_id ON sectors (id);
+CREATE INDEX ix_sectors_name ON sectors (name);
+CREATE TABLE categories (
+	id INTEGER NOT NULL,
+	name VARCHAR(100) NOT NULL,
+	model_id INTEGER NOT NULL,
+	pos INTEGER NOT NULL,
+	description VARCHAR NOT NULL,
+	unit VARCHAR NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(model_id) REFERENCES models (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_categories_name ON categories (name);
+CREATE INDEX ix_categories_id ON categories (id);
+CREATE TABLE temp_models (
+	id INTEGER NOT NULL,
+	name VARCHAR NOT NULL,
+	description VARCHAR,
+	model_id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	economic_matrix BLOB NOT NULL,
+	leontief_matrix BLOB NOT NULL,
+	catimpct_matrix BLOB NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(model_id) REFERENCES models (id),
+	FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE INDEX ix_temp_models_id ON temp_models (id);
+CREATE INDEX ix_temp_models_name ON temp_models (name);
+CREATE TABLE temp_sectors (
+	id INTEGER NOT NULL,
+	name VARCHAR(100) NOT NULL,
+	model_id INTEGER NOT NULL,
+	pos INTEGER NOT NULL,
+	value_added FLOAT NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(model_id) REFERENCES temp_models (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_temp_sectors_id ON temp_sectors (id);
+CREATE INDEX ix_temp_sectors_name ON temp_sectors (name);
+CREATE TABLE temp_categories (
+	id INTEGER NOT NULL,
+	name VARCHAR(100) NOT NULL,
+	model_id INTEGER NOT NULL,
+	pos INTEGER NOT NULL,
+	description VARCHAR NOT NULL,
+	unit VARCHAR NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(model_id) REFERENCES temp_models (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_temp_categories_name ON temp_categories (name);
+CREATE INDEX ix_temp_categories_id ON temp_categories (id);
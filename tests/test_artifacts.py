@@ -0,0 +1,143 @@
+"""
+Tests for the artifact store of the importer
+"""
+import io
+import os
+import socket
+import threading
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from zipfile import ZipFile
+
+from pytest import fixture, mark, raises
+
+from api.artifacts import ArtifactError, ArtifactStore
+
+CONTENT = bytes(range(256)) * 1000
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    ranges = []
+
+    def do_GET(self):
+        if self.path.startswith("/error"):
+            self.send_error(500)
+            return
+        header = self.headers.get("Range")
+        RangeHandler.ranges.append(header)
+        start = int(header[len("bytes="):-1]) if header else 0
+        self.send_response(206 if header else 200)
+        self.send_header("Content-Length", str(len(CONTENT) - start))
+        self.end_headers()
+        self.wfile.write(CONTENT[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    RangeHandler.ranges = []
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_download_resumes_partial_file(tmp_path, server):
+    store = ArtifactStore(str(tmp_path))
+    url = f"{server}/data/file.bin"
+    with open(os.path.join(store.root, "partial", store._key_name(url) + ".part"), "wb") as fh:
+        fh.write(CONTENT[:1000])
+
+    path = store.fetch(url, expected=sha256(CONTENT).hexdigest())
+
+    assert RangeHandler.ranges == ["bytes=1000-"]
+    assert os.path.basename(path) == sha256(CONTENT).hexdigest()
+    with open(path, "rb") as fh:
+        assert fh.read() == CONTENT
+    assert store.fetch(url) == path
+    assert len(RangeHandler.ranges) == 1
+
+
+def test_download_checks_checksum(tmp_path, server):
+    store = ArtifactStore(str(tmp_path))
+
+    with raises(ArtifactError):
+        store.fetch(f"{server}/file.bin", expected="0" * 64)
+
+    assert store.lookup(f"{server}/file.bin") is None
+
+
+def test_offline_mirror(tmp_path):
+    mirror = tmp_path / "mirror" / "Contas"
+    mirror.mkdir(parents=True)
+    with ZipFile(mirror / "tables.zip", "w") as archive:
+        archive.writestr("tables/tab2.ods", CONTENT)
+    (mirror / "tab3.ods").write_bytes(CONTENT[:10])
+    store = ArtifactStore(str(tmp_path / "store"), mirror=str(tmp_path / "mirror"))
+
+    path = store.extract("https://example.org/Contas/tables.zip", "tables/tab2.ods")
+    with open(path, "rb") as fh:
+        assert fh.read() == CONTENT
+    # Members may also be mirrored already extracted
+    path = store.extract("https://example.org/Contas/other.zip", "tables/tab3.ods")
+    with open(path, "rb") as fh:
+        assert fh.read() == CONTENT[:10]
+
+    with raises(ArtifactError):
+        store.fetch("https://example.org/missing.ods")
+
+
+def test_download_errors(tmp_path, server):
+    store = ArtifactStore(str(tmp_path))
+    url = f"{server}/error/file.bin"
+    with open(os.path.join(store.root, "partial", store._key_name(url) + ".part"), "wb") as fh:
+        fh.write(CONTENT[:1000])
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        closed = f"http://127.0.0.1:{sock.getsockname()[1]}/file.bin"
+
+    with raises(ArtifactError, match="HTTP 500"):
+        store.fetch(url)
+    with raises(ArtifactError):
+        store.fetch(closed)
+
+
+def zipped(member: str, content: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with ZipFile(buffer, "w") as archive:
+        archive.writestr(member, content)
+    return buffer.getvalue()
+
+
+@mark.parametrize("archive", [
+    zipped("tab.ods", CONTENT)[:len(CONTENT) // 2],
+    zipped("tab.ods", CONTENT).replace(CONTENT[:256], bytes(256), 1),
+    b"not a zip file",
+], ids=["truncated", "corrupt member", "not a zip"])
+def test_corrupt_archive(tmp_path, archive):
+    mirror = tmp_path / "mirror"
+    mirror.mkdir()
+    (mirror / "tables.zip").write_bytes(archive)
+    store = ArtifactStore(str(tmp_path / "store"), mirror=str(mirror))
+    url = "https://example.org/tables.zip"
+
+    with raises(ArtifactError, match="not a valid zip archive"):
+        store.extract(url, "tab.ods")
+
+    assert store.lookup(url) is None
+    assert store.lookup(f"{url}#tab.ods") is None
+    assert os.listdir(os.path.join(store.root, "partial")) == []
+
+
+def test_missing_member(tmp_path):
+    mirror = tmp_path / "mirror"
+    mirror.mkdir()
+    (mirror / "tables.zip").write_bytes(zipped("tab.ods", CONTENT))
+    store = ArtifactStore(str(tmp_path / "store"), mirror=str(mirror))
+
+    with raises(ArtifactError, match="not found"):
+        store.extract("https://example.org/tables.zip", "other.ods")
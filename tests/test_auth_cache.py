@@ -0,0 +1,43 @@
+"""
+Tests for the cache of users' roles
+"""
+from pytest import fixture
+
+from api import auth_cache, models
+from api.security import resolve_principal
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def db(db):
+    auth_cache.clear()
+    guest, admin, other = models.Role(name="guest"), models.Role(name="admin"), models.Role(name="other")
+    user = models.User(username="u", firstname="f", lastname="l", email="e", password="p")
+    user.roles.append(other)
+    db.add_all([guest, admin, other, user])
+    db.commit()
+    yield db
+    auth_cache.clear()
+
+
+def test_principal_is_cached(db, count_queries):
+    principal = resolve_principal(db, "u")
+    queries = len(count_queries)
+
+    assert not principal.admin
+    assert principal.role_ids == {1, 3}
+    assert resolve_principal(db, "u") is principal
+    assert len(count_queries) == queries
+    assert resolve_principal(db, None).role_ids == {1}
+    assert resolve_principal(db, "nobody") is None
+
+
+def test_invalidate_reloads_roles(db):
+    assert not resolve_principal(db, "u").admin
+    user = db.query(models.User).one()
+    user.roles.append(db.query(models.Role).filter_by(name="admin").one())
+    db.commit()
+
+    assert not resolve_principal(db, "u").admin
+    auth_cache.invalidate("u")
+    assert resolve_principal(db, "u").admin
@@ -0,0 +1,33 @@
+"""
+Tests for the visibility of models to roles
+"""
+import numpy
+from pytest import fixture
+
+from api import crud, models
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def db(db):
+    roles = [models.Role(id=i, name=f"r{i}") for i in range(1, 4)]
+    for (i, model_roles) in enumerate([roles[:2], roles[1:2], [], roles[2:]], start=1):
+        model = models.Model(id=i, name=f"m{i}", economic_matrix=numpy.zeros((1, 1)), leontief_matrix=numpy.eye(1),
+                             catimpct_matrix=numpy.ones((1, 1)))
+        model.roles.extend(model_roles)
+        db.add(model)
+    db.commit()
+    return db
+
+
+def test_models_are_listed_once(db):
+    assert [m.id for m in crud.get_models_filtered_role(db, [1, 2])] == [1, 2]
+    assert [m.id for m in crud.get_models_filtered_role(db, [])] == []
+    assert [m.id for m in crud.get_models_filtered_role(db, None, True)] == [1, 2, 3, 4]
+
+
+def test_get_model_checks_roles(db):
+    assert crud.get_model(db, 1, [1, 2]).id == 1
+    assert crud.get_model(db, 1, None, True).id == 1
+    assert crud.get_model(db, 4, [1, 2]) is None
+    assert crud.get_model(db, 3, [1, 2, 3]) is None
@@ -0,0 +1,50 @@
+"""
+Tests for the matrix storage format
+"""
+import pickle
+
+import numpy
+from pytest import mark, raises
+from sqlalchemy import text
+
+from api.database import create_db_engine, decode_matrix, encode_matrix
+from api.settings import DB_POOL_SIZE, SQLITE_BUSY_TIMEOUT
+
+
+@mark.parametrize("matrix", [
+    numpy.arange(12, dtype=numpy.float64).reshape((3, 4)),
+    numpy.asfortranarray(numpy.arange(12, dtype=numpy.float64).reshape((3, 4))),
+    numpy.empty((0, 0)),
+    numpy.arange(5, dtype=">i4"),
+])
+def test_matrix_roundtrip(matrix):
+    loaded = decode_matrix(encode_matrix(matrix))
+
+    assert loaded.dtype == matrix.dtype
+    assert loaded.shape == matrix.shape
+    assert numpy.array_equal(loaded, matrix)
+
+
+def test_decoded_matrix_is_readonly():
+    loaded = decode_matrix(encode_matrix(numpy.eye(3)))
+
+    assert not loaded.flags.writeable
+    with raises(ValueError):
+        loaded[0, 0] = 2
+
+
+def test_pickled_matrix_is_rejected():
+    with raises(ValueError) as e:
+        decode_matrix(pickle.dumps(numpy.eye(3)))
+
+    assert "migrated" in str(e)
+
+
+def test_sqlite_engine_is_tuned(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA foreign_keys")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_BUSY_TIMEOUT
+    assert engine.pool.size() == DB_POOL_SIZE
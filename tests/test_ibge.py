@@ -1,6 +1,7 @@
 """
 Tests for the IBGE importer
 """
+import numpy as np
 import pyexcel as p
 from pytest import raises, fixture
 
@@ -17,6 +18,13 @@ def va_book():
     return p.get_book(file_name="tests/68_tab2_2015.ods")
 
 
+@fixture(scope="session")
+def cached_book(book, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("ibge") / "book")
+    ibge.CachedBook.from_book(book).save(path)
+    return ibge.CachedBook.load(path)
+
+
 def test_acquire_data():
     assert ibge.acquire_data(year=2015)
 
@@ -101,3 +109,63 @@ def test_added_value_loader(va_book):
     assert va_data[-1][1] == 5972110
     assert va_data[-1][-1] == 6381222
     assert va_data[0][41] == 685708
+
+
+def test_cached_book_matches_book(book, cached_book):
+    assert ibge.load_sheet(cached_book, "03") == ibge.load_sheet(book, "03")
+    assert ibge.load_sectors(cached_book) == ibge.load_sectors(book)
+    assert (ibge.get_marketshare(cached_book) == ibge.get_marketshare(book)).all()
+    assert (ibge.get_taxes(cached_book) == ibge.get_taxes(book)).all()
+
+    with raises(Exception) as e:
+        ibge.load_sheet(cached_book, "potato")
+
+    assert "potato" in str(e)
+
+
+def test_open_book_uses_cache(tmp_path):
+    first = ibge.open_book("tests/68_tab2_2015.ods", str(tmp_path))
+    second = ibge.open_book("tests/68_tab2_2015.ods", str(tmp_path))
+
+    assert len(list(tmp_path.iterdir())) == 1
+    assert isinstance(second.sheets["VA"][0], np.memmap)
+    assert ibge.get_added_value(second) == ibge.get_added_value(first)
+
+
+def test_stream_book_matches_book(book, va_book):
+    streamed = ibge.stream_book("tests/Matriz_de_Insumo_Produto_2015_Nivel_67.ods", ibge.MIP_SHEETS)
+    streamed_va = ibge.stream_book("tests/68_tab2_2015.ods", ibge.VA_SHEETS)
+
+    assert list(streamed.sheets) == list(ibge.MIP_SHEETS)
+    assert len(ibge.load_sheet(streamed, "04")) == 134
+    assert ibge.load_sheet(streamed, "03") == ibge.load_sheet(book, "03")
+    assert ibge.build_z_matrix(streamed, streamed_va) == ibge.build_z_matrix(book, va_book)
+
+
+def test_build_model_data(book, va_book):
+    data = ibge.build_model_data(book, va_book)
+
+    assert data["economic_matrix"].shape == (67, 67)
+    assert data["leontief_matrix"].shape == (67, 67)
+    assert data["catimpct_matrix"].shape == (len(data["categories"]), 67)
+    assert data["linkage_matrix"].shape == (3, 67)
+    assert len(data["sectors"]) == 67
+    assert data["categories"][:2] == ["Importação", "Impostos indiretos líquidos de Subsídios"]
+
+
+def test_find_workbooks(tmp_path):
+    for name in ("Matriz_de_Insumo_Produto_2015_Nivel_67.ods", "68_tab2_2015.ods", "68_tab2_2016.ods"):
+        (tmp_path / name).touch()
+
+    assert ibge.find_workbooks([str(tmp_path)]) == {
+        2015: (str(tmp_path / "Matriz_de_Insumo_Produto_2015_Nivel_67.ods"), str(tmp_path / "68_tab2_2015.ods")),
+    }
+
+
+def test_a_matrix_arrays(book, va_book):
+    rows, columns, a_matrix = ibge.a_matrix_arrays(book, va_book)
+    df_a = ibge.build_a_matrix(book, va_book)
+
+    assert rows == list(df_a.index)
+    assert columns == list(df_a.columns)
+    assert np.array_equal(a_matrix, df_a.to_numpy())
@@ -0,0 +1,24 @@
+"""
+Tests for the precomputed model indicators
+"""
+import numpy
+
+from api import indicators
+
+
+def test_compute_indicators():
+    leontief_matrix = numpy.array([[1.2, 0.3], [0.1, 1.4]])
+    catimpct_matrix = numpy.array([[1.0, 2.0]])
+
+    linkage_matrix, catmult_matrix = indicators.compute_indicators(leontief_matrix, catimpct_matrix)
+
+    assert numpy.allclose(linkage_matrix[indicators.OUTPUT_MULTIPLIERS], [1.3, 1.7])
+    assert numpy.allclose(linkage_matrix[indicators.BACKWARD_LINKAGES], [1.3 / 1.5, 1.7 / 1.5])
+    assert numpy.allclose(linkage_matrix[indicators.FORWARD_LINKAGES], [1.5 / 1.5, 1.5 / 1.5])
+    assert numpy.allclose(catmult_matrix, [[1.4, 3.1]])
+
+
+def test_compute_indicators_mismatched_impacts():
+    _, catmult_matrix = indicators.compute_indicators(numpy.eye(3), numpy.empty((0, 0)))
+
+    assert catmult_matrix is None
@@ -0,0 +1,92 @@
+"""
+Tests for the incremental Leontief updates
+"""
+import numpy
+from pytest import fixture, mark
+
+from api import leontief
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def economic_matrix():
+    rng = numpy.random.default_rng(67)
+    return rng.uniform(0, 0.05, (12, 12))
+
+
+@mark.parametrize("cells", [[(0, 3)], [(1, 1), (5, 1), (7, 1)], [(2, 0), (2, 4), (2, 9)], [(0, 0), (4, 6)]])
+def test_update_coefficients(economic_matrix, cells):
+    new_economic = economic_matrix.copy()
+    for (row, col) in cells:
+        new_economic[row, col] += 0.02
+
+    updated = leontief.update_coefficients(leontief.inverse(economic_matrix), economic_matrix, new_economic)
+
+    assert numpy.allclose(updated, leontief.inverse(new_economic))
+
+
+def test_update_coefficients_without_changes(economic_matrix):
+    leontief_matrix = leontief.inverse(economic_matrix)
+
+    assert leontief.update_coefficients(leontief_matrix, economic_matrix, economic_matrix) is leontief_matrix
+
+
+@mark.parametrize("pos", [0, 5, 12])
+def test_insert_sector(economic_matrix, pos):
+    rng = numpy.random.default_rng(pos)
+    new_economic = numpy.insert(economic_matrix, pos, rng.uniform(0, 0.05, 12), 1)
+    new_economic = numpy.insert(new_economic, pos, rng.uniform(0, 0.05, 13), 0)
+
+    updated = leontief.insert_sector(leontief.inverse(economic_matrix), new_economic, pos)
+
+    assert numpy.allclose(updated, leontief.inverse(new_economic))
+
+
+def test_insert_first_sector():
+    new_economic = numpy.array([[0.25]])
+
+    assert numpy.allclose(leontief.insert_sector(numpy.empty((0, 0)), new_economic, 0), [[4 / 3]])
+
+
+@mark.parametrize("pos", [0, 5, 11])
+def test_delete_sector(economic_matrix, pos):
+    new_economic = numpy.delete(numpy.delete(economic_matrix, pos, 0), pos, 1)
+
+    updated = leontief.delete_sector(leontief.inverse(economic_matrix), new_economic, pos)
+
+    assert numpy.allclose(updated, leontief.inverse(new_economic))
+
+
+def test_many_updates_stay_accurate(economic_matrix):
+    rng = numpy.random.default_rng(5)
+    leontief_matrix = leontief.inverse(economic_matrix)
+    for step in range(300):
+        size = economic_matrix.shape[0]
+        if step % 3 == 0 or size < 4:
+            pos = int(rng.integers(size + 1))
+            new_economic = numpy.insert(economic_matrix, pos, rng.uniform(0, 0.05, size), 1)
+            new_economic = numpy.insert(new_economic, pos, rng.uniform(0, 0.05, size + 1), 0)
+            leontief_matrix = leontief.insert_sector(leontief_matrix, new_economic, pos)
+        elif step % 3 == 1 and size > 8:
+            pos = int(rng.integers(size))
+            new_economic = numpy.delete(numpy.delete(economic_matrix, pos, 0), pos, 1)
+            leontief_matrix = leontief.delete_sector(leontief_matrix, new_economic, pos)
+        else:
+            new_economic = economic_matrix.copy()
+            new_economic[:, int(rng.integers(size))] = rng.uniform(0, 0.05, size)
+            leontief_matrix = leontief.update_coefficients(leontief_matrix, economic_matrix, new_economic)
+        economic_matrix = new_economic
+
+    assert leontief.residual(leontief_matrix, economic_matrix) < leontief.RESIDUAL_LIMIT
+    assert numpy.allclose(leontief_matrix, leontief.inverse(economic_matrix))
+
+
+def test_drifted_inverse_is_recomputed(economic_matrix):
+    drifted = leontief.inverse(economic_matrix) + 1e-6
+    new_economic = economic_matrix.copy()
+    new_economic[3, 4] += 0.02
+
+    updated = leontief.update_coefficients(drifted, economic_matrix, new_economic)
+
+    assert leontief.residual(drifted, economic_matrix) > leontief.RESIDUAL_LIMIT
+    assert numpy.allclose(updated, leontief.inverse(new_economic), rtol=0, atol=1e-12)
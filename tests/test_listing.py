@@ -0,0 +1,51 @@
+"""
+Tests for pagination, prefix filters and projection of lists
+"""
+import json
+
+from fastapi import Response
+from pytest import fixture
+
+from api import listing, models, schemas
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def db(db):
+    db.add_all(models.Role(name=name) for name in ("ab", "abc", "b", "aa", "ac"))
+    db.commit()
+    return db
+
+
+def params(after=None, limit=None, prefix=None, fields=None):
+    return listing.ListParams(after=after, limit=limit, prefix=prefix, fields=fields)
+
+
+def test_pages_follow_cursor(db):
+    response = Response()
+    first = listing.page(db.query(models.Role), models.Role, models.Role.name, schemas.Role, params(limit=2), response)
+    after = int(response.headers[listing.NEXT_HEADER])
+    rest = listing.page(db.query(models.Role), models.Role, models.Role.name, schemas.Role,
+                        params(after=after, limit=3), Response())
+
+    assert [r.name for r in first] == ["ab", "abc"]
+    assert [r.name for r in rest] == ["b", "aa", "ac"]
+
+
+def test_prefix_and_fields(db):
+    response = listing.page(db.query(models.Role), models.Role, models.Role.name, schemas.Role,
+                            params(prefix="ab", fields="name"), Response())
+
+    assert json.loads(response.body) == [{"name": "ab"}, {"name": "abc"}]
+
+
+def test_projected_page_headers(db):
+    response = Response()
+    response.headers["X-Other"] = "1"
+    projected = listing.page(db.query(models.Role), models.Role, models.Role.name, schemas.Role,
+                             params(limit=2, fields="name"), response)
+
+    assert projected.headers[listing.NEXT_HEADER] == "2"
+    assert projected.headers["content-length"] == str(len(projected.body))
+    assert projected.headers["content-type"] == "application/json"
+    assert "X-Other" not in projected.headers
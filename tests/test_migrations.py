@@ -0,0 +1,125 @@
+"""
+Tests for the upgrade of databases created by older versions of the API
+"""
+import pickle
+import sqlite3
+from pathlib import Path
+
+import numpy
+from pytest import fixture
+from sqlalchemy import event, text
+from sqlalchemy.orm import sessionmaker
+
+from api import migrations, models
+from api.database import Base, create_db_engine
+
+BASELINE_SCHEMA = Path(__file__).parent / "baseline_schema.sql"
+
+ECONOMIC = numpy.array([[0.1, 0.2], [0.3, 0.1]])
+LEONTIEF = numpy.linalg.inv(numpy.eye(2) - ECONOMIC)
+CATIMPCT = numpy.array([[1.0, 2.0]])
+EDITED = numpy.array([[0.2, 0.2], [0.3, 0.1]])
+
+
+def pickled(*matrices):
+    """Matrices as the first version of the API stored them"""
+    return tuple(pickle.dumps(matrix) for matrix in matrices)
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def engine(tmp_path):
+    """Engine on a database with the first schema of the API and rows in every table"""
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(str(path))
+    with conn:
+        conn.executescript(BASELINE_SCHEMA.read_text())
+        conn.execute("INSERT INTO users VALUES (1, 'u', 'f', 'l', 'e', 'p', 1, 1, NULL)")
+        conn.execute("INSERT INTO roles VALUES (1, 'r', NULL)")
+        conn.execute("INSERT INTO user_roles VALUES (1, 1)")
+        conn.execute("INSERT INTO models VALUES (1, 'base', NULL, ?, ?, ?)", pickled(ECONOMIC, LEONTIEF, CATIMPCT))
+        conn.execute("INSERT INTO model_roles VALUES (1, 1)")
+        conn.executemany("INSERT INTO sectors VALUES (?, ?, 1, ?, 1.0)", [(1, 's0', 0), (2, 's1', 1)])
+        conn.execute("INSERT INTO categories VALUES (1, 'c', 1, 0, 'd', 'u')")
+        # Temporary models held a full copy of their base model's matrices
+        conn.execute("INSERT INTO temp_models VALUES (1, 'copy', NULL, 1, 1, ?, ?, ?)",
+                     pickled(ECONOMIC, LEONTIEF, CATIMPCT))
+        conn.execute("INSERT INTO temp_models VALUES (2, 'edited', NULL, 1, 1, ?, ?, ?)",
+                     pickled(EDITED, numpy.linalg.inv(numpy.eye(2) - EDITED), CATIMPCT))
+        conn.executemany("INSERT INTO temp_sectors VALUES (?, ?, ?, ?, 1.0)",
+                         [(1, 's0', 1, 0), (2, 's1', 1, 1), (3, 's0', 2, 0), (4, 's1', 2, 1)])
+        conn.executemany("INSERT INTO temp_categories VALUES (?, 'c', ?, 0, 'd', 'u')", [(1, 1), (2, 2)])
+    conn.close()
+    engine = create_db_engine(f"sqlite:///{path}")
+    # As on startup, see `api.main`
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def test_upgrade_keeps_temporary_models(engine):
+    migrations.upgrade(engine)
+
+    session = sessionmaker(bind=engine)()
+    copy, edited = session.query(models.TempModel).order_by(models.TempModel.id).all()
+    assert (copy.name, edited.name) == ("copy", "edited")
+    assert [sector.name for sector in edited.sectors] == ["s0", "s1"]
+    assert len(copy.categories) == 1
+    # Copies identical to the base model's are shared again
+    assert copy.own_economic_matrix is None and copy.own_catimpct_matrix is None
+    assert numpy.array_equal(copy.economic_matrix, ECONOMIC)
+    assert numpy.array_equal(edited.own_economic_matrix, EDITED)
+    assert edited.own_catimpct_matrix is None
+    assert edited.last_accessed is not None
+    session.close()
+
+
+def test_upgrade_gives_every_row_a_generation(engine):
+    migrations.upgrade(engine)
+
+    with engine.connect() as conn:
+        generations = [row[0] for row in conn.execute(text("SELECT generation FROM models UNION ALL "
+                                                           "SELECT generation FROM temp_models"))]
+    assert len(generations) == 3
+    assert None not in generations
+    assert len(set(generations)) == 3
+
+
+def test_upgrade_unpickles_matrices(engine):
+    migrations.upgrade(engine)
+
+    session = sessionmaker(bind=engine)()
+    base = session.query(models.Model).one()
+    edited = session.query(models.TempModel).filter_by(name="edited").one()
+    assert numpy.array_equal(base.economic_matrix, ECONOMIC)
+    assert numpy.array_equal(base.leontief_matrix, LEONTIEF)
+    assert numpy.array_equal(base.catimpct_matrix, CATIMPCT)
+    assert numpy.array_equal(edited.own_economic_matrix, EDITED)
+    assert numpy.array_equal(edited.own_leontief_matrix, numpy.linalg.inv(numpy.eye(2) - EDITED))
+    session.close()
+
+
+def test_upgrade_applies_migrations_once(engine):
+    migrations.upgrade(engine)
+    with engine.connect() as conn:
+        applied = conn.execute(migrations.schema_migrations.select()).fetchall()
+    assert [row.name for row in applied] == [name for (name, _) in migrations.MIGRATIONS]
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    migrations.upgrade(engine)
+
+    with engine.connect() as conn:
+        assert conn.execute(migrations.schema_migrations.select()).fetchall() == applied
+        assert conn.execute(text("PRAGMA foreign_keys")).scalar() == 1
+    writes = [query for query in queries if query.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))]
+    assert not writes
+
+
+def test_upgrade_indexes_role_names(engine):
+    migrations.upgrade(engine)
+
+    with engine.connect() as conn:
+        plan = conn.execute(text("EXPLAIN QUERY PLAN "
+                                 "SELECT id FROM roles WHERE name >= 'a' AND name < 'b'")).fetchall()
+    assert "ix_roles_name" in " ".join(str(row[-1]) for row in plan)
@@ -0,0 +1,41 @@
+"""
+Tests for the in-memory model cache
+"""
+from types import SimpleNamespace
+
+import numpy
+
+from api import model_cache
+
+
+def fake_model(version, generation="g"):
+    return SimpleNamespace(
+        generation=generation,
+        version=version,
+        economic_matrix=numpy.zeros((2, 2)),
+        leontief_matrix=numpy.eye(2),
+        catimpct_matrix=numpy.ones((1, 2)),
+        sectors=[SimpleNamespace(id=i, model_id=1, name=f"s{i}", pos=1 - i, value_added=1.0) for i in range(2)],
+        categories=[SimpleNamespace(id=1, model_id=1, name="c", pos=0, description="d", unit="u")],
+    )
+
+
+def test_load_is_keyed_by_version():
+    first = model_cache.load(1, fake_model(0))
+
+    assert [s.pos for s in first.sectors] == [0, 1]
+    assert model_cache.load(1, fake_model(0)) is first
+    assert model_cache.load(1, fake_model(1)) is not first
+
+
+def test_reused_id_misses():
+    first = model_cache.load(3, fake_model(0))
+
+    assert model_cache.load(3, fake_model(0, generation="h")) is not first
+
+
+def test_invalidate_drops_model():
+    first = model_cache.load(2, fake_model(0))
+    model_cache.invalidate(2)
+
+    assert model_cache.load(2, fake_model(0)) is not first
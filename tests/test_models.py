@@ -0,0 +1,62 @@
+"""
+Tests for the copy-on-write matrices of temporary models
+"""
+import numpy
+from pytest import fixture
+
+from api import models
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def db(db):
+    user = models.User(username="u", firstname="f", lastname="l", email="e", password="p")
+    economic_matrix = numpy.array([[0.1, 0.2], [0.3, 0.1]])
+    db.add(models.Model(id=1, name="base", economic_matrix=economic_matrix,
+                        leontief_matrix=numpy.linalg.inv(numpy.eye(2) - economic_matrix),
+                        catimpct_matrix=numpy.ones((1, 2))))
+    db.add(user)
+    db.commit()
+    return db
+
+
+def clone(db) -> models.TempModel:
+    base = db.query(models.Model).get(1)
+    tmp = models.TempModel(name=base.name, base_model=base, owner=db.query(models.User).first())
+    db.add(tmp)
+    db.commit()
+    return tmp
+
+
+def test_clone_shares_matrices(db):
+    tmp = clone(db)
+    base = tmp.base_model
+
+    assert tmp.own_economic_matrix is None and tmp.own_linkage_matrix is None
+    assert numpy.array_equal(tmp.economic_matrix, base.economic_matrix)
+    assert numpy.array_equal(tmp.linkage_matrix, base.linkage_matrix)
+
+
+def test_clone_copies_changed_matrix(db):
+    tmp = clone(db)
+    tmp.catimpct_matrix = numpy.full((1, 2), 2.0)
+    db.commit()
+
+    assert tmp.own_economic_matrix is None
+    assert tmp.own_catimpct_matrix is not None
+    assert numpy.array_equal(tmp.catmult_matrix, tmp.catimpct_matrix @ tmp.leontief_matrix)
+    assert numpy.array_equal(tmp.base_model.catimpct_matrix, numpy.ones((1, 2)))
+
+
+def test_base_change_materializes_clones(db):
+    tmp = clone(db)
+    base = tmp.base_model
+    old_economic, old_linkage = base.economic_matrix, base.linkage_matrix
+    base.economic_matrix = numpy.zeros((2, 2))
+    base.leontief_matrix = numpy.eye(2)
+    db.commit()
+    db.expire_all()
+
+    assert numpy.array_equal(tmp.own_economic_matrix, old_economic)
+    assert numpy.array_equal(tmp.linkage_matrix, old_linkage)
+    assert tmp.own_catimpct_matrix is None
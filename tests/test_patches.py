@@ -0,0 +1,105 @@
+"""
+Tests for the routes editing some coefficients of a model
+"""
+import numpy
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pytest import fixture, mark
+
+from api import models
+from api.auth_cache import Principal
+from api.deps import get_db
+from api.routers import model
+from api.security import get_principal
+
+ECONOMIC = numpy.arange(16, dtype=numpy.float64).reshape((4, 4)) / 100
+IMPACTS = numpy.arange(8, dtype=numpy.float64).reshape((2, 4))
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def db(db):
+    base = models.Model(id=1, name="m", economic_matrix=ECONOMIC,
+                        leontief_matrix=numpy.linalg.inv(numpy.eye(4) - ECONOMIC), catimpct_matrix=IMPACTS)
+    base.sectors.extend(models.Sector(name=f"s{i}", pos=i, value_added=1.0) for i in range(4))
+    base.categories.extend(models.Category(name=f"c{i}", pos=i, description="d", unit="u") for i in range(2))
+    db.add(base)
+    db.commit()
+    return db
+
+
+@fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(model.router, prefix='/models')
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_principal] = lambda: Principal(None, True, frozenset())
+    return TestClient(app)
+
+
+def stored(db) -> models.Model:
+    db.expire_all()
+    return db.query(models.Model).get(1)
+
+
+def test_coefs_patch(db, client):
+    patch = {"cells": [{"row": 0, "col": 3, "value": 0.3}], "rows": {"1": [0.1, 0, 0, 0.2]},
+             "columns": {"2": [0.05, 0.05, 0.05, 0.05]}}
+    expected = ECONOMIC.copy()
+    expected[1, :] = [0.1, 0, 0, 0.2]
+    expected[:, 2] = 0.05
+    expected[0, 3] = 0.3
+
+    assert client.post('/models/1/coefs/patch', json=patch).status_code == 200
+
+    patched = stored(db)
+    assert numpy.array_equal(patched.economic_matrix, expected)
+    assert numpy.allclose(patched.leontief_matrix, numpy.linalg.inv(numpy.eye(4) - expected))
+    assert numpy.array_equal(patched.catimpct_matrix, IMPACTS)
+    assert patched.version == 1
+
+
+def test_impacts_patch(db, client):
+    patch = {"cells": [{"row": 1, "col": 0, "value": -1}], "rows": {"0": [1, 2, 3, 4]},
+             "columns": {"3": [7, 7]}}
+
+    assert client.post('/models/1/impacts/patch', json=patch).status_code == 200
+
+    patched = stored(db)
+    assert numpy.array_equal(patched.catimpct_matrix, [[1, 2, 3, 7], [-1, 5, 6, 7]])
+    assert numpy.array_equal(patched.economic_matrix, ECONOMIC)
+    assert patched.version == 1
+
+
+@mark.parametrize("route", ["coefs", "impacts"])
+@mark.parametrize("patch", [
+    {"rows": {"0": [0.1, 0.2]}},
+    {"columns": {"0": [0.1] * 5}},
+    {"rows": {"-1": [0.1] * 4}},
+    {"columns": {"4": [0.1] * 4}},
+    {"cells": [{"row": 0, "col": -1, "value": 0.1}]},
+    {"cells": [{"row": 4, "col": 0, "value": 0.1}]},
+], ids=["short row", "long column", "negative row", "column out of range", "negative cell", "cell out of range"])
+def test_invalid_patch(db, client, route, patch):
+    assert client.post(f'/models/1/{route}/patch', json=patch).status_code == 400
+
+    unchanged = stored(db)
+    assert numpy.array_equal(unchanged.economic_matrix, ECONOMIC)
+    assert numpy.array_equal(unchanged.catimpct_matrix, IMPACTS)
+    assert unchanged.version == 0
+
+
+def test_patch_invalidates_results(client):
+    def simulate():
+        response = client.post('/models/1/simulate', json={"values": {"2": 1.0}})
+        assert response.status_code == 200
+        return response.json()["result"]
+
+    before = simulate()
+    client.post('/models/1/coefs/patch', json={"cells": [{"row": 2, "col": 2, "value": 0.5}]})
+    after = simulate()
+
+    expected = ECONOMIC.copy()
+    expected[2, 2] = 0.5
+    assert numpy.allclose(before, numpy.linalg.inv(numpy.eye(4) - ECONOMIC)[:, 2])
+    assert numpy.allclose(after, numpy.linalg.inv(numpy.eye(4) - expected)[:, 2])
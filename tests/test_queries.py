@@ -0,0 +1,57 @@
+"""
+Tests for the number of queries of list routes, which must not grow with the number of rows
+"""
+from typing import List
+
+import numpy
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+from pytest import fixture, mark
+
+from api import models, schemas
+from api.auth_cache import Principal
+from api.listing import ListParams
+from api.routers import model, role, user
+
+ROWS = 6
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def db(db):
+    guest = models.Role(id=1, name="guest")
+    for i in range(ROWS):
+        tmp = models.Model(name=f"m{i}", economic_matrix=numpy.zeros((1, 1)), leontief_matrix=numpy.eye(1),
+                           catimpct_matrix=numpy.ones((1, 1)))
+        tmp.sectors.append(models.Sector(name="s", pos=0, value_added=1.0))
+        tmp.categories.append(models.Category(name="c", pos=0, description="d", unit="u"))
+        tmp.roles.append(guest)
+        db.add(tmp)
+        db.add(models.User(username=f"u{i}", firstname="f", lastname="l", email=f"u{i}@e.com", password="p",
+                           roles=[guest]))
+    db.commit()
+    db.expire_all()
+    return db
+
+
+def endpoint(router, path: str):
+    return next(route.endpoint for route in router.routes if route.path == path)
+
+
+def all_rows() -> ListParams:
+    return ListParams(after=None, limit=None, prefix=None, fields=None)
+
+
+@mark.parametrize("call, schema, rows, queries", [
+    (lambda db: model.model_list(Response(), all_rows(), db, Principal(None, False, frozenset({1}))),
+     schemas.ModelSummary, ROWS, 3),
+    (lambda db: user.list_all_users(Response(), all_rows(), db), schemas.User, ROWS, 2),
+    (lambda db: endpoint(role.router, '/list')(Response(), all_rows(), db), schemas.Role, 1, 1),
+    (lambda db: endpoint(role.router, '/{role_id}/users')(1, Response(), all_rows(), db), schemas.User, ROWS, 2),
+    (lambda db: endpoint(role.router, '/{role_id}/models')(1, Response(), all_rows(), db),
+     schemas.ModelSummary, ROWS, 3),
+])
+def test_list_queries_are_bounded(db, count_queries, call, schema, rows, queries):
+    assert len(jsonable_encoder(parse_obj_as(List[schema], call(db)))) == rows
+    assert len(count_queries) == queries
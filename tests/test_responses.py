@@ -0,0 +1,106 @@
+"""
+Tests for the binary response formats
+"""
+from io import BytesIO
+
+import numpy
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pytest import fixture
+
+from api import models
+from api.auth_cache import Principal
+from api.deps import get_db
+from api.responses import NPZ_MEDIA_TYPE, NpzResponse, accepts, etag_matches
+from api.routers import model
+from api.security import get_principal
+
+ECONOMIC = numpy.arange(9, dtype=numpy.float64).reshape((3, 3)) / 100
+IMPACTS = numpy.arange(6, dtype=numpy.float64).reshape((2, 3))
+NPZ = {"Accept": NPZ_MEDIA_TYPE}
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def db(db):
+    db.add(models.User(id=1, username="u", firstname="f", lastname="l", email="e", password="p"))
+    base = models.Model(id=1, name="m", economic_matrix=ECONOMIC,
+                        leontief_matrix=numpy.linalg.inv(numpy.eye(3) - ECONOMIC), catimpct_matrix=IMPACTS)
+    base.sectors.extend(models.Sector(name=f"s{i}", pos=i, value_added=1.0) for i in (2, 0, 1))
+    base.categories.extend(models.Category(name=f"c{i}", pos=i, description="d", unit="u") for i in range(2))
+    db.add(base)
+    db.commit()
+    return db
+
+
+@fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(model.router, prefix='/models')
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_principal] = lambda: Principal(1, True, frozenset())
+    return TestClient(app)
+
+
+def load(response) -> dict:
+    assert response.status_code == 200
+    assert response.headers["content-type"] == NPZ_MEDIA_TYPE
+    with numpy.load(BytesIO(response.content)) as archive:
+        return {name: archive[name] for name in archive.files}
+
+
+def test_accepts():
+    assert accepts("application/x-npz", NPZ_MEDIA_TYPE)
+    assert accepts("application/json;q=0.5, application/x-npz;q=1", NPZ_MEDIA_TYPE)
+    assert not accepts("*/*", NPZ_MEDIA_TYPE)
+    assert not accepts(None, NPZ_MEDIA_TYPE)
+
+
+def test_etag_matches():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('"b", W/"a"', '"a"')
+    assert not etag_matches('*', '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches(None, '"a"')
+
+
+def test_npz_response_roundtrip():
+    response = NpzResponse({"matrix": numpy.eye(3), "names": numpy.array(["a", "b"])})
+
+    archive = numpy.load(BytesIO(response.body))
+    assert response.media_type == NPZ_MEDIA_TYPE
+    assert numpy.array_equal(archive["matrix"], numpy.eye(3))
+    assert archive["names"].tolist() == ["a", "b"]
+
+
+def test_model_as_npz(client):
+    arrays = load(client.get('/models/1/get', headers=NPZ))
+
+    assert sorted(arrays) == ["categories", "catimpct_matrix", "economic_matrix", "leontief_matrix", "sectors"]
+    assert numpy.array_equal(arrays["economic_matrix"], ECONOMIC)
+    assert arrays["leontief_matrix"].shape == (3, 3)
+    assert arrays["catimpct_matrix"].shape == (2, 3)
+    assert arrays["sectors"].tolist() == ["s0", "s1", "s2"]
+    assert arrays["categories"].tolist() == ["c0", "c1"]
+
+
+def test_clone_as_npz(db, client):
+    arrays = load(client.post('/models/1/clone', headers=NPZ))
+
+    assert sorted(arrays) == ["categories", "catimpct_matrix", "economic_matrix", "id", "sectors"]
+    assert arrays["id"].shape == ()
+    assert int(arrays["id"]) == -db.query(models.TempModel.id).scalar()
+    assert numpy.array_equal(arrays["economic_matrix"], ECONOMIC)
+    assert numpy.array_equal(arrays["catimpct_matrix"], IMPACTS)
+    assert arrays["sectors"].tolist() == ["s0", "s1", "s2"]
+
+
+def test_indicators_as_npz(client):
+    arrays = load(client.get('/models/1/indicators', headers=NPZ))
+
+    assert sorted(arrays) == ["backward_linkages", "categories", "category_multipliers", "forward_linkages",
+                              "output_multipliers", "sectors"]
+    for name in ("output_multipliers", "backward_linkages", "forward_linkages"):
+        assert arrays[name].shape == (3,)
+    assert arrays["category_multipliers"].shape == (2, 3)
+    assert numpy.allclose(arrays["output_multipliers"], numpy.linalg.inv(numpy.eye(3) - ECONOMIC).sum(axis=0))
@@ -0,0 +1,40 @@
+"""
+Tests for the cache of simulation results
+"""
+import os
+
+import numpy
+
+from api import result_cache
+
+
+def test_key_is_canonical():
+    key = result_cache.result_key(1, "g", 0, [{0: 1.0, 3: 2.0}], None)
+
+    assert result_cache.result_key(1, "g", 0, [{3: 2.0, 0: 1}], None) == key
+    assert result_cache.result_key(1, "g", 1, [{0: 1.0, 3: 2.0}], None) != key
+    assert result_cache.result_key(1, "g", 0, [{0: 1.0}, {3: 2.0}], None) != key
+    assert result_cache.result_key(1, "g", 0, [{0: 1.0, 3: 2.0}], [[0.5]]) != key
+    assert result_cache.etag(key, "json") != result_cache.etag(key, "npz")
+
+
+def test_reused_id_misses():
+    key = result_cache.result_key(1, "g", 0, [{0: 1.0}], None)
+    reused = result_cache.result_key(1, "h", 0, [{0: 1.0}], None)
+
+    assert reused != key
+    assert result_cache.etag(reused, "json") != result_cache.etag(key, "json")
+
+
+def test_results_are_stored(tmp_path):
+    key = result_cache.result_key(-7, "g", 2, [{0: 1.0}], None)
+    result = result_cache.put(key, (numpy.ones((2, 1)), numpy.ones((1, 2, 3))), cache_dir=str(tmp_path))
+    result_cache.invalidate(-7, cache_dir=None)
+
+    stored = result_cache.get(key, cache_dir=str(tmp_path))
+    assert not result[0].flags.writeable
+    assert numpy.array_equal(stored[1], result[1])
+
+    result_cache.invalidate(-7, cache_dir=str(tmp_path))
+    assert result_cache.get(key, cache_dir=str(tmp_path)) is None
+    assert not os.path.exists(tmp_path / "-7")
@@ -0,0 +1,123 @@
+"""
+Tests for the simulation routes
+"""
+import numpy
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pytest import fixture
+
+from api import models
+from api.auth_cache import Principal
+from api.deps import get_db
+from api.routers import model
+from api.security import get_principal
+from api.settings import MAX_BATCH_SCENARIOS
+
+ECONOMIC = numpy.arange(9, dtype=numpy.float64).reshape((3, 3)) / 100
+IMPACTS = numpy.arange(6, dtype=numpy.float64).reshape((2, 3))
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def db(db):
+    base = models.Model(id=1, name="m", economic_matrix=ECONOMIC,
+                        leontief_matrix=numpy.linalg.inv(numpy.eye(3) - ECONOMIC), catimpct_matrix=IMPACTS)
+    base.sectors.extend(models.Sector(name=f"s{i}", pos=i, value_added=1.0) for i in range(3))
+    base.categories.extend(models.Category(name=f"c{i}", pos=i, description="d", unit="u") for i in range(2))
+    db.add(base)
+    db.commit()
+    return db
+
+
+@fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(model.router, prefix='/models')
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_principal] = lambda: Principal(None, True, frozenset())
+    return TestClient(app)
+
+
+@fixture
+def simulations(monkeypatch):
+    """Scenarios of every simulation the routes run or take from the result cache"""
+    calls = []
+    cached_simulation = model.cached_simulation
+
+    async def counted(key, cached, scenarios, change):
+        calls.append(scenarios)
+        return await cached_simulation(key, cached, scenarios, change)
+
+    monkeypatch.setattr(model, "cached_simulation", counted)
+    return calls
+
+
+def test_matching_etag_is_not_modified(client, simulations):
+    first = client.post('/models/1/simulate', json={"values": {"0": 1.0}})
+    tag = first.headers["ETag"]
+
+    again = client.post('/models/1/simulate', json={"values": {"0": 1.0}}, headers={"If-None-Match": tag})
+
+    assert first.status_code == 200
+    assert again.status_code == 304
+    assert again.headers["ETag"] == tag
+    assert not again.content
+    assert len(simulations) == 1
+
+
+def test_coefficient_edit_changes_etag(client, simulations):
+    tag = client.post('/models/1/simulate', json={"values": {"0": 1.0}}).headers["ETag"]
+
+    patch = {"cells": [{"row": 0, "col": 1, "value": 0.2}]}
+    assert client.post('/models/1/coefs/patch', json=patch).status_code == 200
+    again = client.post('/models/1/simulate', json={"values": {"0": 1.0}}, headers={"If-None-Match": tag})
+
+    assert again.status_code == 200
+    assert again.headers["ETag"] != tag
+    assert len(simulations) == 2
+    patched = ECONOMIC.copy()
+    patched[0, 1] = 0.2
+    assert numpy.allclose(again.json()["result"], numpy.linalg.inv(numpy.eye(3) - patched)[:, 0])
+
+
+def test_wildcard_etag_is_ignored(client, simulations):
+    response = client.post('/models/1/simulate', json={"values": {"0": 1.0}}, headers={"If-None-Match": "*"})
+
+    assert response.status_code == 200
+    assert len(response.json()["result"]) == 3
+    assert len(simulations) == 1
+
+
+def test_matching_batch_etag_is_not_modified(client, simulations):
+    batch = {"scenarios": [{"0": 1.0}, {"2": 3.0}]}
+    tag = client.post('/models/1/simulate/batch', json=batch).headers["ETag"]
+
+    again = client.post('/models/1/simulate/batch', json=batch, headers={"If-None-Match": tag})
+    single = client.post('/models/1/simulate', json={"values": {"0": 1.0}}, headers={"If-None-Match": tag})
+
+    assert again.status_code == 304
+    assert single.status_code == 200
+    assert len(simulations) == 2
+
+
+def test_batch_matches_single_simulations(client):
+    scenarios = [{"0": 1.0}, {"1": 2.0, "2": 0.5}, {"2": 3.0}]
+    change = [[0.01] * 3] * 3
+
+    batch = client.post('/models/1/simulate/batch', json={"scenarios": scenarios, "change": change})
+    singles = [client.post('/models/1/simulate', json={"values": values, "change": change}).json()
+               for values in scenarios]
+
+    assert batch.status_code == 200
+    assert len(batch.json()) == len(scenarios)
+    for (output, single) in zip(batch.json(), singles):
+        assert output["categories"] == single["categories"]
+        assert numpy.allclose(output["result"], single["result"])
+        assert numpy.allclose(output["detailed"], single["detailed"])
+
+
+def test_batch_size_is_limited(client, simulations):
+    scenarios = [{"0": 1.0}] * (MAX_BATCH_SCENARIOS + 1)
+
+    assert client.post('/models/1/simulate/batch', json={"scenarios": scenarios}).status_code == 422
+    assert not simulations
@@ -0,0 +1,60 @@
+"""
+Tests for the simulation engine
+"""
+import numpy
+from pytest import fixture, raises
+
+from api import simulation
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def economic_matrix():
+    rng = numpy.random.default_rng(855)
+    return rng.uniform(0, 0.1, (6, 6))
+
+
+def test_solve_matches_inverse(economic_matrix):
+    change = numpy.full(economic_matrix.shape, 0.1)
+    demand = numpy.arange(6, dtype=numpy.float64).reshape((6, 1))
+
+    factors = simulation.factorize("solve", "g", 0, economic_matrix, change)
+    a_matrix = 1.1 * economic_matrix
+    expected = numpy.linalg.inv(numpy.eye(6) - a_matrix) @ demand
+
+    assert numpy.allclose(simulation.solve(factors, demand), expected)
+
+
+def test_factorization_is_cached(economic_matrix):
+    change = numpy.zeros(economic_matrix.shape)
+
+    first = simulation.factorize("cached", "g", 0, economic_matrix, change)
+    assert simulation.factorize("cached", "g", 0, economic_matrix, change.copy()) is first
+    assert simulation.factorize("cached", "g", 0, economic_matrix, change + 0.5) is not first
+    assert simulation.factorize("cached", "g", 1, economic_matrix, change) is not first
+    assert simulation.factorize("cached", "h", 0, economic_matrix, change) is not first
+
+    simulation.invalidate("cached")
+    assert simulation.factorize("cached", "g", 0, economic_matrix, change) is not first
+
+
+def test_demand_matrix_stacks_scenarios():
+    demand = simulation.demand_matrix(3, [{0: 1.0}, {1: 2.0, 2: 3.0}])
+
+    assert demand.shape == (3, 2)
+    assert demand[:, 0].tolist() == [1, 0, 0]
+    assert demand[:, 1].tolist() == [0, 2, 3]
+
+    with raises(IndexError):
+        simulation.demand_matrix(3, [{3: 1.0}])
+
+
+def test_detail_impacts_matches_single_scenario(economic_matrix):
+    catimpct_matrix = numpy.arange(12, dtype=numpy.float64).reshape((2, 6))
+    production = economic_matrix[:, :4]
+
+    details = simulation.detail_impacts(production, catimpct_matrix)
+
+    assert details.shape == (4, 6, 2)
+    for (idx, detail) in enumerate(details):
+        assert numpy.allclose(detail, production[:, [idx]] * catimpct_matrix.T)
@@ -0,0 +1,52 @@
+"""
+Tests for the expiration of temporary models
+"""
+from datetime import datetime, timedelta
+
+import numpy
+from pytest import fixture
+
+from api import crud, models, sweeper
+
+
+# pylint:disable=redefined-outer-name
+@fixture
+def db(db):
+    user = models.User(username="u", firstname="f", lastname="l", email="e", password="p")
+    base = models.Model(name="base", economic_matrix=numpy.zeros((1, 1)), leontief_matrix=numpy.eye(1),
+                        catimpct_matrix=numpy.ones((1, 1)))
+    long_ago = datetime.utcnow() - timedelta(days=2)
+    for name in ("old", "used", "new"):
+        tmp = models.TempModel(name=name, base_model=base, owner=user,
+                               last_accessed=datetime.utcnow() if name == "new" else long_ago)
+        tmp.sectors.append(models.TempSector(name="s", pos=0, value_added=1.0))
+        db.add(tmp)
+    db.commit()
+    return db
+
+
+def test_sweep_deletes_expired_models(db):
+    used = db.query(models.TempModel).filter_by(name="used").one()
+    crud.get_temporary_model(db, used.id, used.user_id)
+    db.expire_all()
+
+    assert sweeper.sweep(db, ttl=24 * 3600) == 1
+    assert sorted(name for (name,) in db.query(models.TempModel.name)) == ["new", "used"]
+    assert db.query(models.TempSector).count() == 2
+    assert db.query(models.Model).count() == 1
+
+
+def test_accesses_are_written_at_most_once_per_interval(db, count_queries):
+    new, used = (db.query(models.TempModel).filter_by(name=name).one() for name in ("new", "used"))
+    queries = len(count_queries)
+
+    sweeper.record_access(db, new)
+    assert len(count_queries) == queries
+    sweeper.record_access(db, used)
+    written = used.last_accessed
+    assert len(count_queries) == queries + 1
+    sweeper.record_access(db, used)
+    assert len(count_queries) == queries + 1
+
+    db.expire_all()
+    assert used.last_accessed == written
@@ -0,0 +1,78 @@
+"""
+Tests for the executor of numerical work
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pytest import raises
+
+from api import workers
+from api.settings import COMPUTE_WORKERS
+
+
+def test_run_is_bounded():
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def work():
+        with lock:
+            running.append(None)
+            peak.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.pop()
+        return threading.current_thread().name
+
+    with ThreadPoolExecutor(max_workers=COMPUTE_WORKERS * 3) as requests:
+        names = list(requests.map(lambda _: workers.run(work), range(COMPUTE_WORKERS * 6)))
+
+    assert max(peak) <= COMPUTE_WORKERS
+    assert all(name.startswith('compute') for name in names)
+
+
+def test_run_raises_in_caller():
+    with raises(ZeroDivisionError):
+        workers.run(lambda: 1 / 0)
+
+
+def test_full_pool_rejects():
+    pool = workers.Pool('test', max_workers=1, max_queue=1)
+    release = threading.Event()
+    with ThreadPoolExecutor(max_workers=2) as requests:
+        running = [requests.submit(pool.run, release.wait) for _ in range(2)]
+        while pool.stats()["pending"] < 2:
+            time.sleep(0.001)
+        with raises(workers.PoolFull):
+            pool.run(release.wait)
+        release.set()
+        assert all(future.result() for future in running)
+
+    stats = pool.stats()
+    assert (stats["completed"], stats["rejected"], stats["pending"]) == (2, 1, 0)
+    assert stats["max_wait_seconds"] > 0
+
+
+def test_run_async_leaves_the_loop_free():
+    pool = workers.Pool('test', max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run_async(release.wait, 5))
+        while pool.stats()["pending"] < 1:
+            await asyncio.sleep(0.001)
+        # The loop still runs, and the pool still counts and bounds its tasks
+        queued = asyncio.ensure_future(pool.run_async(lambda: 1 / 0))
+        await asyncio.sleep(0)
+        with raises(workers.PoolFull):
+            await pool.run_async(release.wait, 5)
+        release.set()
+        assert await running
+        with raises(ZeroDivisionError):
+            await queued
+
+    asyncio.run(scenario())
+
+    assert pool.stats()["pending"] == 0